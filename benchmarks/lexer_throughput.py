@@ -0,0 +1,71 @@
+#!/usr/bin/env python3
+"""
+Measure the lexing throughput of FileReader and BufferReader on a synthetic FpSeq file.
+"""
+
+import argparse
+import os
+import tempfile
+import time
+
+from fprime_test_sequencer.parser.lexer import BufferReader, FileReader, Lexer
+
+
+def generate_fpseq(nb_lines: int) -> str:
+    lines = []
+    while len(lines) < nb_lines:
+        i = len(lines)
+        lines += [
+            f"TEST SEQ test_{i}",
+            "  # Generated sequence",
+            "  [:] EXPECT NO EVENT EventSeverity.WARNING_HI",
+            f"  [{i % 1000}] COMMAND eventAction.SCHEDULE_NUMBER_CRUNCHER 5 600 60",
+            f"    [:100] EXPECT EVENT cmdDisp.OpCodeDispatched re\"0x{i:x}\"",
+            "    [4000:7000] EXPECT EVENT eventAction.ModeChanged \"Mode set to \"\"MEASURE\"\"\"",
+            "    [:15000] EXPECT TELEMETRY eventAction.Version re\"\\d\"",
+            "  [100000] UPLINK \"/input/IOD_v2\" \"/home/root/executables/IOD_v2\"",
+            "  [160000] RUNSEQ simple_seq",
+        ]
+    return "\n".join(lines[:nb_lines]) + "\n"
+
+
+def lex(reader) -> int:
+    lexer = Lexer(reader)
+    count = 0
+    while lexer.next_token() != None:
+        count += 1
+    return count
+
+
+def measure(make_reader, filename: str, size: int, repeat: int) -> tuple[float, int]:
+    best = float("inf")
+    for _ in range(repeat):
+        start = time.perf_counter()
+        count = lex(make_reader(filename))
+        best = min(best, time.perf_counter() - start)
+    return size / best / 1e6, count
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("--lines", type=int, default=20000, help="number of lines of the generated file [default: 20000]")
+    parser.add_argument("--repeat", type=int, default=3, help="number of measurements, the best one is kept [default: 3]")
+    args = parser.parse_args()
+
+    with tempfile.TemporaryDirectory() as tmp_dir:
+        filename = os.path.join(tmp_dir, "bench.fpseq")
+        with open(filename, "w") as f:
+            f.write(generate_fpseq(args.lines))
+        size = os.path.getsize(filename)
+        print(f"Lexing {args.lines} lines ({size / 1e6:.2f} MB)")
+
+        before, before_count = measure(FileReader, filename, size, args.repeat)
+        after, after_count = measure(BufferReader, filename, size, args.repeat)
+
+    assert before_count == after_count, "readers produced different token counts"
+    print(f"  FileReader:   {before:8.2f} MB/s")
+    print(f"  BufferReader: {after:8.2f} MB/s ({after / before:.1f}x)")
+
+
+if __name__ == "__main__":
+    main()
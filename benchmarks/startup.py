@@ -0,0 +1,80 @@
+#!/usr/bin/env python3
+"""
+Measure the import time of the command line entry point with -X importtime, and fail if it exceeds a
+budget or imports fprime-gds, which only runs need and syntax checks must not pay for.
+"""
+
+import argparse
+import os
+import subprocess
+import sys
+import tempfile
+import time
+
+
+MODULE = "fprime_test_sequencer.cli"
+# Packages the syntax check must not import
+FORBIDDEN_PACKAGES = ("fprime", "fprime_gds")
+CHECKED_SOURCE = """TEST SEQ startup
+  [0] COMMAND cmdDisp.CMD_NO_OP
+    [:100] EXPECT EVENT cmdDisp.OpCodeDispatched re"0x500"
+    [:500] EXPECT TELEMETRY cmdDisp.CommandsDispatched BETWEEN 1 10
+"""
+
+
+def import_times() -> dict[str, tuple[int, int]]:
+    """Return the self and cumulative import time in microseconds of each module imported by MODULE."""
+    result = subprocess.run([sys.executable, "-X", "importtime", "-c", f"import {MODULE}"], capture_output=True, text=True, check=True)
+    times = {}
+    for line in result.stderr.splitlines():
+        if not line.startswith("import time:") or "self [us]" in line:
+            continue
+        self_us, cumulative_us, name = line.removeprefix("import time:").split("|")
+        times[name.strip()] = (int(self_us), int(cumulative_us))
+    return times
+
+
+def check_time(filename: str) -> float:
+    """Return the wall time of a syntax check of filename, interpreter startup included."""
+    start = time.perf_counter()
+    subprocess.run([sys.executable, "-m", MODULE, "--check", "--no-cache", filename], stdout=subprocess.DEVNULL, check=True)
+    return time.perf_counter() - start
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("--budget-ms", type=float, default=150, help=f"import time of {MODULE} above which startup regressed [default: 150]")
+    parser.add_argument("--repeat", type=int, default=5, help="number of measurements, the best one is kept [default: 5]")
+    parser.add_argument("--top", type=int, default=10, help="number of slowest imports listed [default: 10]")
+    args = parser.parse_args()
+
+    runs = [import_times() for _ in range(args.repeat)]
+    times = min(runs, key=lambda t: t[MODULE][1])
+    total_ms = times[MODULE][1] / 1000
+
+    print(f"Slowest imports of {MODULE}:")
+    for name, (self_us, cumulative_us) in sorted(times.items(), key=lambda t: t[1][0], reverse=True)[:args.top]:
+        print(f"  {name:<48s} {self_us / 1000:8.1f} ms self {cumulative_us / 1000:8.1f} ms cumulative")
+
+    with tempfile.TemporaryDirectory() as tmp_dir:
+        filename = os.path.join(tmp_dir, "startup.fpseq")
+        with open(filename, "w") as f:
+            f.write(CHECKED_SOURCE)
+        best_check = min(check_time(filename) for _ in range(args.repeat))
+    print(f"\nImport of {MODULE}: {total_ms:.1f} ms (budget: {args.budget_ms:.0f} ms)")
+    print(f"Syntax check of a single sequence: {1000 * best_check:.1f} ms")
+
+    success = True
+    forbidden = sorted(name for name in times if name.split(".")[0] in FORBIDDEN_PACKAGES)
+    if len(forbidden) > 0:
+        print(f"REGRESSION: {MODULE} imports {len(forbidden)} fprime-gds module(s), e.g. {', '.join(forbidden[:5])}")
+        success = False
+    if total_ms > args.budget_ms:
+        print(f"REGRESSION: import of {MODULE} is over budget")
+        success = False
+    if not success:
+        sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,271 @@
+#!/usr/bin/env python3
+"""
+Time the parsing, validation and logging stages on synthetic FpSeq files and histories, and write
+the timings and peak memory of each stage to a JSON file, optionally compared to a previous one.
+"""
+
+import argparse
+import gc
+import json
+import os
+import platform
+import random
+import sys
+import tempfile
+import time
+import tracemalloc
+from datetime import datetime, timezone
+from typing import Callable
+
+from fprime_test_sequencer.cache import tool_version
+from fprime_test_sequencer.clock import Clock
+from fprime_test_sequencer.history import HistoryIndex
+from fprime_test_sequencer.logs import LogWriter
+from fprime_test_sequencer.parser.lexer import BufferReader, Lexer
+from fprime_test_sequencer.parser.parser import Parser, Sequence
+from fprime_test_sequencer.replay import LoggedItem
+from fprime_test_sequencer.validator import validate_history
+
+
+NB_COMPONENTS = 20
+NB_VALUES = 100
+# Slowdowns smaller than this are taken as noise, whatever their ratio
+MIN_REGRESSION_S = 0.005
+SEVERITIES = ["EventSeverity.ACTIVITY_HI", "EventSeverity.ACTIVITY_LO", "EventSeverity.COMMAND", "EventSeverity.WARNING_LO"]
+
+
+def event_name(rng: random.Random) -> str:
+    return f"component_{rng.randrange(NB_COMPONENTS)}.Event_{rng.randrange(10)}"
+
+
+def channel_name(rng: random.Random) -> str:
+    return f"component_{rng.randrange(NB_COMPONENTS)}.Channel_{rng.randrange(10)}"
+
+
+def expected_value(rng: random.Random, regex_density: float) -> str:
+    if rng.random() < regex_density:
+        return f're"value {rng.randrange(10)}\\d*"'
+    return f'"value {rng.randrange(NB_VALUES)}"'
+
+
+def numeric_predicate(rng: random.Random) -> str:
+    """Return a predicate on the numbers of the generated values, which range from 0 to NB_VALUES - 1."""
+    threshold = rng.randrange(NB_VALUES)
+    return rng.choice([
+        f"BETWEEN {threshold} {threshold + rng.randrange(NB_VALUES // 2)}",
+        f"ABOVE {threshold}",
+        f"BELOW {threshold}",
+        f"{threshold} WITHIN {rng.randrange(NB_VALUES // 2)}.5",
+    ])
+
+
+def generate_sequence(rng: random.Random, name: str, is_test: bool, nb_instructions: int, depth: int,
+                      runseqs: list[str], regex_density: float, numeric_density: float) -> list[str]:
+    lines = [f"{'TEST ' if is_test else ''}SEQ {name}"]
+    level = 1
+    for _ in range(nb_instructions):
+        indent = "  " * level
+        kind = rng.random()
+        if kind < 0.3:
+            lines.append(f"{indent}[{rng.randrange(1000)}] COMMAND component_{rng.randrange(NB_COMPONENTS)}.CMD_{rng.randrange(10)} {rng.randrange(100)} \"arg\"")
+        elif kind < 0.6:
+            no = "NO " if rng.random() < 0.1 else ""
+            lines.append(f"{indent}[:{rng.randrange(100, 5000)}] EXPECT {no}EVENT {event_name(rng)} {expected_value(rng, regex_density)}")
+        elif kind < 0.95:
+            start = rng.randrange(1000)
+            window = f"[{start}:{start + rng.randrange(100, 5000)}]"
+            if rng.random() < numeric_density:
+                quantifier = "ALL " if rng.random() < 0.2 else ""
+                lines.append(f"{indent}{window} EXPECT {quantifier}TELEMETRY {channel_name(rng)} {numeric_predicate(rng)}")
+            else:
+                lines.append(f"{indent}{window} EXPECT TELEMETRY {channel_name(rng)} {expected_value(rng, regex_density)}")
+        else:
+            lines.append(f"{indent}[{rng.randrange(1000)}] UPLINK \"/input/file_{rng.randrange(10)}\" \"/dest/file\"")
+        # The following instructions are either nested, relative to this one, or back to an outer level
+        level = min(depth, level + 1) if rng.random() < 0.5 else rng.randint(1, level)
+    for seq_name in runseqs:
+        lines.append(f"  [{rng.randrange(10000)}] RUNSEQ {seq_name}")
+    return lines
+
+
+def generate_fpseq(rng: random.Random, nb_sequences: int, nb_instructions: int, depth: int, fanout: int, regex_density: float,
+                   numeric_density: float) -> str:
+    """
+    Generate tests and as many included sequences, each test including fanout sequences and each
+    included sequence including up to fanout of the following ones, so that includes are nested.
+    """
+    nb_tests = (nb_sequences + 1) // 2
+    nb_included = nb_sequences - nb_tests
+    lines = []
+    for i in range(nb_tests):
+        runseqs = [f"included_{rng.randrange(nb_included)}" for _ in range(fanout)] if nb_included > 0 else []
+        lines += generate_sequence(rng, f"test_{i}", True, nb_instructions, depth, runseqs, regex_density, numeric_density)
+    for i in range(nb_included):
+        runseqs = [f"included_{j}" for j in rng.sample(range(i + 1, nb_included), min(rng.randint(0, fanout), nb_included - i - 1))]
+        lines += generate_sequence(rng, f"included_{i}", False, nb_instructions, depth, runseqs, regex_density, numeric_density)
+    return "\n".join(lines) + "\n"
+
+
+def generate_history(rng: random.Random, nb_items: int, duration_s: float) -> tuple[HistoryIndex, HistoryIndex, list[tuple[float, str]]]:
+    """Generate indexed events and telemetry received over duration_s, along with their log entries."""
+    values = [f"value {n}" for n in range(NB_VALUES)]
+    event_index, telemetry_index = HistoryIndex(), HistoryIndex()
+    entries = []
+    for n in range(nb_items):
+        time_s = duration_s * n / nb_items
+        value = values[rng.randrange(NB_VALUES)]
+        if rng.random() < 0.2:
+            name, severity = event_name(rng), SEVERITIES[rng.randrange(len(SEVERITIES))]
+            item = LoggedItem(time_s, f'{severity} {name} "{value}"', value)
+            event_index.add(name, time_s, item)
+            event_index.add(severity, time_s, item)
+            entries.append((time_s, f"EVENT {item.text}"))
+        else:
+            name = channel_name(rng)
+            item = LoggedItem(time_s, f'{name} "{value}"', value)
+            telemetry_index.add(name, time_s, item)
+            entries.append((time_s, f"TELEMETRY {item.text}"))
+    return event_index, telemetry_index, entries
+
+
+class SteppedClock(Clock):
+    """Clock following the times of the logged entries, as if they were received live."""
+
+    def __init__(self) -> None:
+        self.now = 0.0
+
+    def time(self) -> float:
+        return self.now
+
+
+def lex(source: str) -> int:
+    lexer = Lexer(BufferReader("bench.fpseq", source))
+    count = 0
+    while lexer.next_token() != None:
+        count += 1
+    return count
+
+
+def flatten(parser: Parser, sequences: dict[str, Sequence], runseqs: dict) -> dict[str, Sequence]:
+    flattened: dict[str, Sequence] = {}
+    for name in sequences.keys():
+        parser.flatten_seq(name, sequences, runseqs, flattened)
+    return flattened
+
+
+def validate(tests: list[Sequence], event_index: HistoryIndex, telemetry_index: HistoryIndex) -> int:
+    matches = 0
+    for seq in tests:
+        event_verdicts, telemetry_verdicts = validate_history(seq, event_index, telemetry_index, 0.0)
+        matches += sum(1 for verdict in event_verdicts + telemetry_verdicts if verdict.match != None)
+    return matches
+
+
+def write_logs(filename: str, entries: list[tuple[float, str]]):
+    clock = SteppedClock()
+    log_writer = LogWriter(filename, 0.0, clock)
+    for time_s, text in entries:
+        clock.now = time_s
+        log_writer.add(time_s, text)
+    log_writer.close()
+
+
+def measure(stage: Callable[[], object], repeat: int) -> dict:
+    """Return the best time of stage over repeat runs, and its peak memory over an extra traced run."""
+    best = float("inf")
+    for _ in range(repeat):
+        gc.collect()
+        start = time.perf_counter()
+        stage()
+        best = min(best, time.perf_counter() - start)
+    # Tracing slows allocations down, so memory is measured apart from time
+    gc.collect()
+    tracemalloc.start()
+    stage()
+    _, peak = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+    return {"seconds": best, "peak_bytes": peak}
+
+
+def compare(results: dict, baseline_file: str, threshold: float) -> bool:
+    """Print the ratio of each stage to the baseline, and return False if one is slower than threshold."""
+    with open(baseline_file) as f:
+        baseline = json.load(f)
+    if baseline["parameters"] != results["parameters"]:
+        print(f"Warning: {baseline_file} was measured with different parameters")
+    success = True
+    print(f"\nCompared to {baseline_file} ({baseline['version']}):")
+    for name, result in results["stages"].items():
+        if name not in baseline["stages"]:
+            continue
+        ratio = result["seconds"] / baseline["stages"][name]["seconds"]
+        regressed = ratio > threshold and result["seconds"] - baseline["stages"][name]["seconds"] > MIN_REGRESSION_S
+        success &= not regressed
+        print(f"  {name:<18s} {ratio:6.2f}x time, {result['peak_bytes'] / max(1, baseline['stages'][name]['peak_bytes']):6.2f}x memory{'  REGRESSION' if regressed else ''}")
+    return success
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("--sequences", type=int, default=100, help="number of sequences, half of them tests [default: 100]")
+    parser.add_argument("--instructions", type=int, default=50, help="number of instructions per sequence [default: 50]")
+    parser.add_argument("--depth", type=int, default=4, help="maximum indentation depth [default: 4]")
+    parser.add_argument("--fanout", type=int, default=3, help="number of RUNSEQ instructions per sequence [default: 3]")
+    parser.add_argument("--regex-density", type=float, default=0.3, help="fraction of expectations matching a regular expression [default: 0.3]")
+    parser.add_argument("--numeric-density", type=float, default=0.2, help="fraction of telemetry expectations checking a numeric predicate [default: 0.2]")
+    parser.add_argument("--history-items", type=int, default=1000000, help="number of events and telemetry items of the history [default: 1000000]")
+    parser.add_argument("--seed", type=int, default=0, help="seed of the generator [default: 0]")
+    parser.add_argument("--repeat", type=int, default=3, help="number of timed runs of each stage, the best one is kept [default: 3]")
+    parser.add_argument("--output", default="benchmark.json", help="file to write the results to [default: benchmark.json]")
+    parser.add_argument("--compare", help="results of a previous run to compare to", metavar="BASELINE_FILE")
+    parser.add_argument("--threshold", type=float, default=1.2, help="time ratio to the baseline above which a stage regressed [default: 1.2]")
+    args = parser.parse_args()
+
+    rng = random.Random(args.seed)
+    source = generate_fpseq(rng, args.sequences, args.instructions, args.depth, args.fanout, args.regex_density, args.numeric_density)
+    print(f"Generated {args.sequences} sequences of {args.instructions} instructions ({len(source) / 1e6:.2f} MB)")
+
+    parsed = Parser(Lexer(BufferReader("bench.fpseq", source))).read_sequences()
+    if parsed == None:
+        sys.exit("The generated file doesn't parse")
+    sequences, runseqs = parsed
+    flattened = flatten(Parser(None), sequences, runseqs)
+    tests = [Parser(None).bound_timing(seq) for seq in flattened.values() if seq.is_test]
+    duration_s = 0.001 * max((seq.get_duration() for seq in tests), default=0)
+
+    event_index, telemetry_index, entries = generate_history(rng, args.history_items, duration_s)
+    print(f"Generated {args.history_items} events and telemetry items over {duration_s:.0f} seconds")
+
+    stages: dict[str, Callable[[], object]] = {
+        "lexer": lambda: lex(source),
+        "read_sequences": lambda: Parser(Lexer(BufferReader("bench.fpseq", source))).read_sequences(),
+        "flatten_seq": lambda: flatten(Parser(None), sequences, runseqs),
+        "bound_timing": lambda: [Parser(None).bound_timing(seq) for seq in flattened.values()],
+        "parse": lambda: Parser(Lexer(BufferReader("bench.fpseq", source))).parse(),
+        "validate_sequence": lambda: validate(tests, event_index, telemetry_index),
+    }
+
+    results = {
+        "version": tool_version(),
+        "python": platform.python_version(),
+        "date": datetime.now(timezone.utc).isoformat(timespec="seconds"),
+        "parameters": {name: value for name, value in vars(args).items() if name not in ("repeat", "output", "compare", "threshold")},
+        "stages": {},
+    }
+    with tempfile.TemporaryDirectory() as tmp_dir:
+        stages["write_logs"] = lambda: write_logs(os.path.join(tmp_dir, "bench.log"), entries)
+        for name, stage in stages.items():
+            results["stages"][name] = measure(stage, args.repeat)
+            result = results["stages"][name]
+            print(f"  {name:<18s} {1000 * result['seconds']:10.1f} ms {result['peak_bytes'] / 1e6:10.1f} MB peak")
+
+    with open(args.output, "w") as f:
+        json.dump(results, f, indent=2)
+    print(f"Results written to {args.output}")
+
+    if args.compare is not None and not compare(results, args.compare, args.threshold):
+        sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,243 @@
+import asyncio
+import time
+from typing import Callable, TextIO
+
+from fprime_gds.common.data_types.ch_data import ChData
+from fprime_gds.common.data_types.event_data import EventData
+from fprime_gds.common.testing_fw.api import IntegrationTestAPI
+from fprime_test_sequencer.history import LocalTimeChronologicalHistory, ch_index_keys, event_index_keys
+from fprime_test_sequencer.parser.parser import CommandInstruction, Sequence, UplinkInstruction
+from fprime_test_sequencer.parser.windows import WindowIndex
+from fprime_test_sequencer.scheduler import JITTER_WARNING_MS, Scheduler
+from fprime_test_sequencer.staging import UplinkStager
+from fprime_test_sequencer.util import ch_data_to_str, event_data_to_str, make_green, make_red
+from fprime_test_sequencer.validator import Consumer, RetentionHorizon, Verdict, print_report
+
+
+UPLINK_POLL_PERIOD_S = 0.05
+UPLINK_END_STATES = {"FINISHED", "CANCELED", "TIMEOUT"}
+
+
+class AsyncSequencer:
+    """
+    Sequencer running each instruction and each expectation window of a sequence as an asyncio task.
+
+    Events and telemetry received by the GDS threads are bridged into the event loop through a queue,
+    from which they are matched against the open expectation windows. Instructions are dispatched in
+    order, each task waiting for the previous instruction to be dispatched, and uplinks are monitored
+    until the uplinker is done with them.
+    """
+
+    def __init__(self, api: IntegrationTestAPI, fail_fast: bool=False, out: TextIO | None=None) -> None:
+        self.api = api
+        self.fail_fast = fail_fast
+        self.out = out
+        self.stager = UplinkStager(self.api.pipeline.up_store)
+        self.scheduler = Scheduler()
+        self.staged: dict[int, str] = {}
+        self.loop: asyncio.AbstractEventLoop | None = None
+        self.received: asyncio.Queue | None = None
+        self.abort: asyncio.Event | None = None
+        self.starting_time = 0.0
+        self.failed = False
+        self.event_windows = WindowIndex([], lambda ei: ei.event)
+        self.telemetry_windows = WindowIndex([], lambda ti: ti.channel)
+        self.event_verdicts: list[Verdict] = []
+        self.telemetry_verdicts: list[Verdict] = []
+        self.event_matched: list[asyncio.Event] = []
+        self.telemetry_matched: list[asyncio.Event] = []
+        self.retention = RetentionHorizon()
+        # Registered after the local time histories, so that received items are already stamped
+        self.event_consumer = Consumer(lambda data: self.bridge(self.on_event, data))
+        self.channel_consumer = Consumer(lambda data: self.bridge(self.on_telemetry, data))
+        self.api.pipeline.coders.register_event_consumer(self.event_consumer)
+        self.api.pipeline.coders.register_channel_consumer(self.channel_consumer)
+        # Received items are only kept while they can still satisfy an expectation
+        for history in (self.api.get_event_test_history(), self.api.get_telemetry_test_history()):
+            if isinstance(history, LocalTimeChronologicalHistory):
+                history.retain_from(self.retention)
+
+
+    def redirect(self, out: TextIO | None):
+        """Print reports to out instead of the standard output."""
+        self.out = out
+
+
+    def close(self):
+        """Stop consuming the items received by the pipeline, which may then be used by another sequencer."""
+        self.api.pipeline.coders.remove_event_consumer(self.event_consumer)
+        self.api.pipeline.coders.remove_channel_consumer(self.channel_consumer)
+        for history in (self.api.get_event_test_history(), self.api.get_telemetry_test_history()):
+            if isinstance(history, LocalTimeChronologicalHistory):
+                history.retain_from(None)
+
+
+    def bridge(self, handler: Callable, data):
+        """Forward data received by a GDS thread to the event loop of the running sequence, if any."""
+        loop, received = self.loop, self.received
+        if loop == None:
+            return
+        try:
+            loop.call_soon_threadsafe(received.put_nowait, (handler, data))
+        except RuntimeError:
+            # The loop was closed in the meantime
+            pass
+
+
+    async def run_and_validate_sequence(self, seq: Sequence) -> bool:
+        header = f" [RUNNING TEST {seq.name}] "
+        print(f"{header:=^80s}", file=self.out)
+
+        # Uplinked files are staged before the sequence clock starts, so that dispatching them is a pure enqueue
+        if len(seq.uplink_instrs) > 0:
+            staging_start = time.perf_counter()
+            self.staged = self.stager.stage(seq.uplink_instrs)
+            print(f"Staged {len(self.staged)} uplink file(s) in {1000 * (time.perf_counter() - staging_start):.1f} ms", file=self.out)
+
+        if seq.event_windows == None or seq.telemetry_windows == None:
+            seq.index_windows()
+        self.loop = asyncio.get_running_loop()
+        self.received = asyncio.Queue()
+        self.abort = asyncio.Event()
+        self.failed = False
+        self.event_windows = seq.event_windows
+        self.telemetry_windows = seq.telemetry_windows
+        self.event_verdicts = [Verdict(ei) for ei in seq.event_instrs]
+        self.telemetry_verdicts = [Verdict(ti) for ti in seq.telemetry_instrs]
+        self.event_matched = [asyncio.Event() for _ in self.event_verdicts]
+        self.telemetry_matched = [asyncio.Event() for _ in self.telemetry_verdicts]
+
+        self.starting_time = time.time()
+        end_time = self.starting_time + 0.001 * seq.get_duration()
+        self.scheduler.start(self.starting_time, seq.name)
+        self.retention.start(self.event_verdicts + self.telemetry_verdicts, self.starting_time)
+
+        dispatcher = asyncio.create_task(self.dispatch_received())
+        tasks = self.instruction_tasks(seq)
+        tasks += [asyncio.create_task(self.watch_window(v, m, event_data_to_str)) for v, m in zip(self.event_verdicts, self.event_matched)]
+        tasks += [asyncio.create_task(self.watch_window(v, m, ch_data_to_str)) for v, m in zip(self.telemetry_verdicts, self.telemetry_matched)]
+
+        print(f"Waiting up to {max(0, end_time - time.time()):.2f} seconds for the sequence to finish...", file=self.out)
+        settled = asyncio.gather(*tasks)
+        aborted = asyncio.create_task(self.abort.wait())
+        await asyncio.wait([settled, aborted], timeout=max(0, end_time - time.time()), return_when=asyncio.FIRST_COMPLETED)
+
+        for task in tasks + [aborted, dispatcher]:
+            task.cancel()
+        await asyncio.gather(settled, aborted, dispatcher, return_exceptions=True)
+        self.loop = None
+        self.retention.stop()
+        self.stager.discard(list(self.staged.values()))
+        self.staged = {}
+        # A failed instruction or window doesn't settle the sequence, its exception is raised as by the threaded sequencer
+        for task in tasks:
+            if task.done() and not task.cancelled() and task.exception() != None:
+                raise task.exception()
+
+        if self.abort.is_set():
+            print(make_red("Expectation failed, aborting sequence"), file=self.out)
+        elif (time_saved := end_time - time.time()) > 0:
+            print(f"All expectations settled, ending sequence {time_saved:.2f} seconds early", file=self.out)
+        # Windows still open when the sequence ends are closed without being reported live
+        for verdict in self.event_verdicts + self.telemetry_verdicts:
+            verdict.closed = True
+
+        jitter_report = self.scheduler.jitter_report()
+        if self.scheduler.max_jitter_ms() >= JITTER_WARNING_MS:
+            jitter_report = make_red(f"{jitter_report}, failures of tight windows may be timing related")
+        print(jitter_report, file=self.out)
+
+        success = print_report(self.event_verdicts, self.telemetry_verdicts, self.starting_time, self.out)
+
+        footer = f" [TEST {seq.name} {'PASSED' if success else 'FAILED'}] "
+        print(f"{make_green(footer) if success else make_red(footer):=^89s}", file=self.out)
+
+        return success
+
+
+    def instruction_tasks(self, seq: Sequence) -> list[asyncio.Task]:
+        instructions: list[tuple[int, CommandInstruction | UplinkInstruction]] = []
+        instructions += [(cmd.send_time_ms, cmd) for cmd in seq.command_instrs]
+        instructions += [(up.uplink_time_ms, up) for up in seq.uplink_instrs]
+
+        # Sort instructions by execution time
+        instructions.sort(key=lambda e: e[0])
+
+        max_exec_time_digits = len(str(instructions[-1][0])) if len(instructions) > 0 else 1
+
+        tasks = []
+        previous: asyncio.Event | None = None
+        for exec_time, instr in instructions:
+            dispatched = asyncio.Event()
+            tasks.append(asyncio.create_task(self.run_instruction(exec_time, instr, previous, dispatched, max_exec_time_digits)))
+            previous = dispatched
+        return tasks
+
+
+    async def run_instruction(self, exec_time: int, instr: CommandInstruction | UplinkInstruction,
+                              previous: asyncio.Event | None, dispatched: asyncio.Event, digits: int):
+        await asyncio.sleep(max(0, 0.001 * exec_time - 0.001 * self.scheduler.elapsed_ms()))
+        # Instructions with the same execution time are dispatched in order
+        if previous != None:
+            await previous.wait()
+
+        dispatch = self.scheduler.record(instr, exec_time)
+        if type(instr) == CommandInstruction:
+            self.api.send_command(instr.command, instr.args)
+            print(f"[{round(dispatch.actual_ms):{digits}} ms]: Sent command {instr.command} {' '.join(instr.args)}", file=self.out)
+            dispatched.set()
+        elif type(instr) == UplinkInstruction:
+            staged_file = self.staged.pop(id(instr))
+            # Handed over to the uplinker, which removes the staged file once done
+            self.api.pipeline.files.uplinker.enqueue(staged_file, instr.dest)
+            print(f"[{round(dispatch.actual_ms):{digits}} ms]: Uplinked file {instr.file} to {instr.dest}", file=self.out)
+            dispatched.set()
+            await self.monitor_uplink(staged_file, instr)
+
+
+    async def monitor_uplink(self, staged_file: str, instr: UplinkInstruction):
+        while True:
+            await asyncio.sleep(UPLINK_POLL_PERIOD_S)
+            states = [f["state"] for f in self.api.pipeline.files.uplinker.current_files() if f["source"] == staged_file]
+            if len(states) > 0 and states[-1] in UPLINK_END_STATES:
+                print(f"[{round(self.scheduler.elapsed_ms())} ms]: Uplink of {instr.file} to {instr.dest} {states[-1].lower()}", file=self.out)
+                return
+
+
+    async def watch_window(self, verdict: Verdict, matched: asyncio.Event, to_str: Callable):
+        remaining = self.starting_time + 0.001 * verdict.instr.end_time_ms - time.time()
+        try:
+            await asyncio.wait_for(matched.wait(), timeout=max(0, remaining))
+        except TimeoutError:
+            pass
+        verdict.closed = True
+        if not verdict.success():
+            self.failed = True
+            match_ = to_str(verdict.evidence(), self.starting_time) if verdict.evidence() is not None else "None"
+            print(f"{verdict.instr}: {make_red('[FAIL]')} ~> {match_}", file=self.out)
+            if self.fail_fast:
+                self.abort.set()
+
+
+    async def dispatch_received(self):
+        while True:
+            handler, data = await self.received.get()
+            handler(data)
+
+
+    def on_event(self, data: EventData):
+        self.on_data(data, event_index_keys(data), data.get_display_text(), self.event_windows, self.event_verdicts, self.event_matched)
+
+
+    def on_telemetry(self, data: ChData):
+        self.on_data(data, ch_index_keys(data), str(data.get_display_text()), self.telemetry_windows, self.telemetry_verdicts, self.telemetry_matched)
+
+
+    def on_data(self, data, keys: list[str], value: str, windows: WindowIndex, verdicts: list[Verdict], matched: list[asyncio.Event]):
+        time_ms = 1000 * (data.get_time().get_float() - self.starting_time)
+        for key in keys:
+            # Only the expectations on key whose window contains the reception time
+            for idx in windows.at(key, time_ms):
+                verdict = verdicts[idx]
+                if not verdict.closed and verdict.observe(data, verdict.instr.matches_value(value)):
+                    matched[idx].set()
@@ -0,0 +1,120 @@
+import contextlib
+import hashlib
+import os
+import pickle
+import tempfile
+from functools import cache
+from importlib.metadata import PackageNotFoundError, version
+from pathlib import Path
+
+from fprime_test_sequencer import parser
+from fprime_test_sequencer.parser.loader import SOURCE_SUFFIX
+from fprime_test_sequencer.parser.parser import Sequence
+
+
+MAX_ENTRIES = 256
+
+
+@cache
+def tool_version() -> str:
+    """Return the package version, along with a digest of the parser sources for development installs."""
+    try:
+        package_version = version("fprime-test-sequencer")
+    except PackageNotFoundError:
+        package_version = "unknown"
+    sources = hashlib.sha256()
+    for source in sorted(Path(parser.__file__).parent.glob("*.py")):
+        sources.update(source.read_bytes())
+    return f"{package_version}+{sources.hexdigest()[:16]}"
+
+
+def import_digest(path: Path) -> str | None:
+    """Return the digest of an imported file, or of the list of sources of an imported directory."""
+    try:
+        if path.is_dir():
+            return hashlib.sha256("\0".join(sorted(p.name for p in path.glob(f"*{SOURCE_SUFFIX}"))).encode()).hexdigest()
+        return hashlib.sha256(path.read_bytes()).hexdigest()
+    except OSError:
+        return None
+
+
+def stat_entries(entries: list[Path]) -> list[tuple[Path, os.stat_result]]:
+    """Return entries along with their status, leaving out the ones removed since listed, e.g. pruned by another process."""
+    stats = []
+    for entry in entries:
+        with contextlib.suppress(OSError):
+            stats += [(entry, entry.stat())]
+    return stats
+
+
+def default_cache_dir() -> Path:
+    return Path(os.environ.get("XDG_CACHE_HOME", Path.home() / ".cache")) / "fprime-test-sequencer"
+
+
+class SequenceCache:
+    """
+    On-disk cache of parsed and flattened sequences, keyed by source content and tool version.
+
+    Entries also hold the digests of the files and directories imported by the source, by path relative
+    to it, so that the same source is parsed again when any of them changed.
+    """
+
+    def __init__(self, directory: Path | None = None) -> None:
+        self.directory = Path(directory) if directory != None else default_cache_dir()
+        self.hits = 0
+        self.misses = 0
+
+    def key(self, source: str) -> str:
+        digest = hashlib.sha256(tool_version().encode())
+        digest.update(b"\0")
+        digest.update(source.encode())
+        return digest.hexdigest()
+
+    def path(self, key: str) -> Path:
+        return self.directory / f"{key}.pickle"
+
+    def load(self, key: str, directory: Path = Path()) -> dict[str, Sequence] | None:
+        """Load the sequences of the source in directory with the given key."""
+        try:
+            with open(self.path(key), 'rb') as f:
+                imports, sequences = pickle.load(f)
+            if any(import_digest(directory / path) != digest for path, digest in imports.items()):
+                raise ValueError("Imported file changed")
+        except Exception:
+            # Missing, unreadable, corrupted or outdated entries are all cache misses
+            self.misses += 1
+            return None
+        # Keep recently used entries from being pruned, unless another process just pruned it
+        with contextlib.suppress(OSError):
+            os.utime(self.path(key))
+        self.hits += 1
+        return sequences
+
+    def store(self, key: str, sequences: dict[str, Sequence], directory: Path = Path(), imports: list[str] = []):
+        """Store the sequences of the source in directory with the given key, along with the paths it imports."""
+        try:
+            digests = {os.path.relpath(path, directory): import_digest(Path(path)) for path in imports}
+            self.directory.mkdir(parents=True, exist_ok=True)
+            fd, tmp_file = tempfile.mkstemp(dir=self.directory, suffix=".tmp")
+            with os.fdopen(fd, 'wb') as f:
+                pickle.dump((digests, sequences), f, protocol=pickle.HIGHEST_PROTOCOL)
+            os.replace(tmp_file, self.path(key))
+            self.prune()
+        except OSError as e:
+            print(f"Couldn't write to sequence cache: {e}")
+
+    def entries(self) -> list[Path]:
+        return list(self.directory.glob("*.pickle")) if self.directory.exists() else []
+
+    def prune(self):
+        entries = sorted(stat_entries(self.entries()), key=lambda e: e[1].st_mtime, reverse=True)
+        for entry, _ in entries[MAX_ENTRIES:]:
+            entry.unlink(missing_ok=True)
+
+    def stats(self) -> str:
+        entries = stat_entries(self.entries())
+        size = sum(stat.st_size for _, stat in entries)
+        return (
+            f"Sequence cache: {self.hits} hit(s), {self.misses} miss(es), "
+            f"{len(entries)} entries ({size / 1000:.1f} kB) in {self.directory}"
+        )
@@ -1,38 +1,42 @@
 #!/usr/bin/env python3
 
+from __future__ import annotations
+
+import json
 import time
 import os
 import argparse
 import platform
+import socket
 from pathlib import Path
+from typing import TYPE_CHECKING
 
-from fprime.common.models.serialize.time_type import TimeType
-
-from fprime_gds.common.history.chrono import ChronologicalHistory
-from fprime_gds.common.pipeline.standard import StandardPipeline
-from fprime_gds.common.testing_fw.api import IntegrationTestAPI
-from fprime_gds.common.utils.config_manager import ConfigManager
-from fprime_gds.executables.utils import find_dict, get_artifacts_root
-
-from fprime_test_sequencer.parser.exceptions import ParseError
-from fprime_test_sequencer.parser.lexer import FileReader, Lexer
-from fprime_test_sequencer.parser.parser import CommandInstruction, Parser, Sequence, UplinkInstruction
-from fprime_test_sequencer.sequencer import Sequencer
-from fprime_test_sequencer.util import ch_data_to_str, event_data_to_str, make_green, make_red, time_to_relative_ms
+# Only modules that don't import fprime-gds are imported here, so that syntax checks start instantly.
+# fprime-gds modules and the modules depending on them are imported once a run needs them.
+from fprime_test_sequencer.cache import SequenceCache
+from fprime_test_sequencer.clock import WALL_CLOCK, Clock, VirtualClock
+from fprime_test_sequencer.jobs import Job, default_socket_path, submit
+from fprime_test_sequencer.parser.exceptions import LoadError, ParseError
+from fprime_test_sequencer.parser.incremental import IncrementalParser, ParseUpdate
+from fprime_test_sequencer.parser.loader import load_sequences, stamp
+from fprime_test_sequencer.parser.parser import Sequence
+from fprime_test_sequencer.profiler import NO_PROFILER, Profiler
+from fprime_test_sequencer.util import make_green, make_red
 
+if TYPE_CHECKING:
+    from fprime_gds.common.pipeline.dictionaries import Dictionaries
+    from fprime_gds.common.pipeline.standard import StandardPipeline
+    from fprime_gds.common.testing_fw.api import IntegrationTestAPI
+    from fprime_test_sequencer.dictionaries import DictionaryCache
 
-class LocalTimeChronologicalHistory(ChronologicalHistory):
-    """
-    A chronological history which replaces remote sending times with local reception times.
-    """
 
-    def data_callback(self, data, sender=None):
-        if self.filter(data):
-            data.time.set_float(time.time())
-        super().data_callback(data, sender)
+# Period at which watched files are polled for changes, in seconds
+WATCH_INTERVAL = 0.1
 
 
 def find_dictionary() -> Path | None:
+    from fprime_gds.executables.utils import find_dict, get_artifacts_root
+
     detected_toolchain = get_artifacts_root() / platform.system()
 
     if not detected_toolchain.exists():
@@ -62,104 +66,226 @@ def find_dictionary() -> Path | None:
     return find_dict(deployment)
 
 
-def write_logs(filename: str, api: IntegrationTestAPI, commands: list[CommandInstruction], uplinks: list[UplinkInstruction], starting_time: float):
-    print(f"Writing logs to {filename}...")
+def parse_file(file: str, cache: SequenceCache | None = None) -> dict[str, Sequence]:
+    try:
+        with open(file, 'r') as f:
+            source = f.read()
+    except FileNotFoundError:
+        print(f"File not found: {file}")
+        exit()
+
+    # Imports are relative to the file, and so are the imported files recorded in the cache
+    directory = Path(file).parent
+    if cache is not None:
+        key = cache.key(source)
+        if (sequences := cache.load(key, directory)) is not None:
+            return sequences
+
+    sequences = None
+    try:
+        sequences, imports = load_sequences(file, source)
+    except (ParseError, LoadError) as e:
+        print(e)
 
-    to_ms = time_to_relative_ms(starting_time)
+    if sequences == None:
+        exit()
 
-    entries: list[tuple[int, str]] = []
+    if cache is not None:
+        cache.store(key, sequences, directory, imports)
 
-    entries += [(
-        cmd.send_time_ms,
-        f"COMMAND {cmd.command} {' '.join(cmd.args)}"
-    ) for cmd in commands]
+    return sequences
 
-    entries += [(
-        to_ms(ed.get_time().get_float()),
-        f"EVENT {event_data_to_str(ed, with_timing=False)}"
-    ) for ed in api.get_event_test_history().retrieve()]
 
-    entries += [(
-        to_ms(cd.get_time().get_float()),
-        f"TELEMETRY {ch_data_to_str(cd, with_timing=False)}"
-    ) for cd in api.get_telemetry_test_history().retrieve()]
+def print_cache_stats(cache: SequenceCache | DictionaryCache | None, kind: str = "Sequence"):
+    print(cache.stats() if cache is not None else f"{kind} cache: disabled")
 
-    entries += [(
-        up.uplink_time_ms,
-        f"UPLINK {up.file} {up.dest}"
-    ) for up in uplinks]
 
-    # Sort log entries by occurence time
-    entries.sort(key=lambda e: e[0])
+def print_sequence(i: int, seq_name: str, seq: Sequence):
+    print(f"\n{i}.")
+    header = f" [SEQUENCE {seq_name}] "
+    print(f"{header:=^80s}")
+    print(f"  is_test: {seq.is_test}")
+    print(f"  duration: {seq.get_duration()} ms")
 
-    with open(filename, 'w') as f:
-        f.writelines([f"[{e[0]} ms] {e[1]}\n" for e in entries])
+    print(f"{' [COMMANDS] ':-^80s}")
+    for command_instr in seq.get_ordered_commands():
+        print(f"  [{command_instr.send_time_ms} ms]: {command_instr.command} {' '.join(command_instr.args)}")
 
+    print(f"{' [EVENTS] ':-^80s}")
+    for event_instr in seq.event_instrs:
+        print(f"  {event_instr}")
 
-def parse_file(file: str) -> dict[str, Sequence]:
-    try:
-        reader = FileReader(file)
-    except FileNotFoundError:
-        print(f"File not found: {file}")
-        exit()
+    print(f"{' [TELEMETRY] ':-^80s}")
+    for telemetry_instr in seq.telemetry_instrs:
+        print(f"  {telemetry_instr}")
 
-    lexer = Lexer(reader)
-    parser = Parser(lexer)
+    print(f"{' [UPLINK] ':-^80s}")
+    for uplink_instr in seq.get_ordered_uplinks():
+        print(f"  [{uplink_instr.uplink_time_ms} ms]: UPLINK {uplink_instr.file} {uplink_instr.dest}")
 
-    sequences = None
+    print(f"{'-'*80}")
+
+
+def check(file: str, cache: SequenceCache | None = None):
+    sequences = parse_file(file, cache)
+
+    print(f"Syntax check [{make_green('OK')}]")
+
+    for i, (seq_name, seq) in enumerate(sequences.items(), start=1):
+        print_sequence(i, seq_name, seq)
+
+
+def watch(file: str, interval: float = WATCH_INTERVAL):
+    """
+    Check file again each time it changes. Only the changed blocks of sequences are read again, and
+    only the sequences whose breakdown changed are printed.
+    """
+    parser = IncrementalParser(file)
+    stamps = None
+    print(f"Watching {file}, press Ctrl-C to stop")
     try:
-        sequences = parser.parse()
-    except ParseError as pe:
-        print(pe)
+        while True:
+            # Imported files and directories are watched as well
+            watched = {path: stamp(path) for path in [file] + parser.loader.paths}
+            if watched[file] is None:
+                # Editors may replace the file when saving it, it is checked again once it is back
+                if stamps != {}:
+                    print(f"File not found: {file}")
+                    stamps = {}
+            elif watched != stamps:
+                try:
+                    with open(file, 'r') as f:
+                        source = f.read()
+                except FileNotFoundError:
+                    continue
+                print_update(parser.update(source))
+                stamps = {path: watched[path] if path in watched else stamp(path) for path in [file] + parser.loader.paths}
+            time.sleep(interval)
+    except KeyboardInterrupt:
+        pass
+
+
+def print_update(update: ParseUpdate):
+    print(f"\n{time.strftime('%H:%M:%S')} ", end="")
+    if update.sequences is None:
+        print(f"Syntax check [{make_red('FAILED')}]")
+        print(update.error)
+    else:
+        print(f"Syntax check [{make_green('OK')}]")
+        flattened = set(update.flattened)
+        for i, (seq_name, seq) in enumerate(update.sequences.items(), start=1):
+            if seq_name in flattened:
+                print_sequence(i, seq_name, seq)
+        for seq_name in update.removed:
+            print(f"Removed sequence {seq_name}")
+    print(f"Read {update.parsed_blocks}/{update.blocks} block(s) in {1000 * update.parse_time:.1f} ms, "
+          f"flattened {len(update.flattened)} sequence(s) in {1000 * update.flatten_time:.1f} ms")
+
+
+def select_tests(sequences: dict[str, Sequence], file: str, test: str | None) -> list[tuple[int, Sequence]]:
+    if test is not None:
+        if test not in sequences.keys():
+            print(f"No test named {test} in {file}")
+            exit()
+        return [(1, sequences[test])]
+    return list(enumerate([sequence for sequence in sequences.values() if sequence.is_test], start=1))
 
-    if sequences == None:
+
+def replay(log_file: str, tests: list[tuple[int, Sequence]]):
+    from fprime_test_sequencer.history import interest_keys
+    from fprime_test_sequencer.replay import Recording
+
+    try:
+        f = open(log_file, 'r')
+    except FileNotFoundError:
+        print(f"File not found: {log_file}")
         exit()
 
-    return sequences
+    loading_start = time.perf_counter()
+    recording = Recording(*interest_keys(sequence for _, sequence in tests))
+    with f:
+        recording.load(f)
+    print(f"Indexed {recording.items} of {recording.entries} log entries from {log_file} in {time.perf_counter() - loading_start:.2f} seconds")
 
+    successes = 0
+    for number, sequence in tests:
+        print(f"\n{number}.")
+        successes += 1 if recording.validate(sequence) else 0
 
-def check(file: str):
-    sequences = parse_file(file)
+    success_rate = f" [{successes}/{len(tests)} TESTS PASSED ({float(successes)/float(len(tests)):.0%})] "
+    print(f"\n{make_green(success_rate) if successes == len(tests) else make_red(success_rate):=^89s}\n")
 
-    print(f"Syntax check [{make_green('OK')}]")
 
-    i = 1
-    for seq_name, seq in sequences.items():
-        print(f"\n{i}.")
-        header = f" [SEQUENCE {seq_name}] "
-        print(f"{header:=^80s}")
-        print(f"  is_test: {seq.is_test}")
-        print(f"  duration: {seq.get_duration()} ms")
+def resolve_dictionary(dictionary: str | None, profiler: Profiler = NO_PROFILER) -> str | None:
+    """Return the path of the dictionary to use, detected if not given, None if there is none."""
+    if dictionary is None:
+        print("Automatically detecting dictionary file...")
+        with profiler.phase("dictionary discovery"):
+            detected = find_dictionary()
+        if detected is None:
+            print("Couldn't detect dictionary")
+            return None
+        dictionary = str(detected)
+    elif not os.path.exists(dictionary):
+        print(f"Dictionary file {dictionary} does not exist")
+        return None
 
-        print(f"{' [COMMANDS] ':-^80s}")
-        for command_instr in seq.get_ordered_commands():
-            print(f"  [{command_instr.send_time_ms} ms]: {command_instr.command} {' '.join(command_instr.args)}")
+    print(f"Using dictionary {dictionary}")
+    return dictionary
 
-        print(f"{' [EVENTS] ':-^80s}")
-        for event_instr in seq.event_instrs:
-            print(f"  {event_instr}")
 
-        print(f"{' [TELEMETRY] ':-^80s}")
-        for telemetry_instr in seq.telemetry_instrs:
-            print(f"  {telemetry_instr}")
+def load_dictionary(dictionary: str, no_cache: bool = False, cache_stats: bool = False, profiler: Profiler = NO_PROFILER) -> Dictionaries:
+    from fprime_test_sequencer.dictionaries import DictionaryCache, load_dictionaries
 
-        print(f"{' [UPLINK] ':-^80s}")
-        for uplink_instr in seq.get_ordered_uplinks():
-            print(f"  [{uplink_instr.uplink_time_ms} ms]: UPLINK {uplink_instr.file} {uplink_instr.dest}")
+    # Loaded once for all endpoints, from the dictionary cache unless the dictionary changed
+    dictionary_cache = None if no_cache else DictionaryCache()
+    start = time.perf_counter()
+    with profiler.phase("dictionary load"):
+        dictionaries, cached = load_dictionaries(dictionary, dictionary_cache)
+    print(f"Loaded dictionary in {time.perf_counter() - start:.3f} s{' from cache' if cached else ''}")
+    if cache_stats:
+        print_cache_stats(dictionary_cache, "Dictionary")
+    return dictionaries
 
-        print(f"{'-'*80}")
-        i += 1
 
+def connect_endpoints(endpoints: list[tuple[str, str]], dictionary: str, dictionaries: Dictionaries, file_storage_directory: str,
+                      event_interest: set[str] | None = None, channel_interest: set[str] | None = None,
+                      clock: Clock = WALL_CLOCK, profiler: Profiler = NO_PROFILER) -> list[IntegrationTestAPI]:
+    apis: list[IntegrationTestAPI] = []
+    try:
+        for addr, port in endpoints:
+            # Each endpoint gets its own storage directory, so that downlinked files don't collide
+            file_storage_dir = file_storage_directory if len(endpoints) == 1 else os.path.join(file_storage_directory, f"{addr}_{port}")
+            apis.append(setup_integration_test_api(dictionary, file_storage_dir, addr, port, event_interest, channel_interest, clock, profiler, dictionaries))
+    except Exception:
+        for api in apis:
+            disconnect(api.pipeline)
+        raise
+    return apis
+
+
+def setup_integration_test_api(dictionary: str, file_storage_dir: str, tts_addr: str, tts_port: str,
+                               event_interest: set[str] | None = None, channel_interest: set[str] | None = None,
+                               clock: Clock = WALL_CLOCK, profiler: Profiler = NO_PROFILER,
+                               dictionaries: Dictionaries | None = None) -> IntegrationTestAPI:
+    from fprime_gds.common.pipeline.standard import StandardPipeline
+    from fprime_gds.common.testing_fw.api import IntegrationTestAPI
+    from fprime_gds.common.utils.config_manager import ConfigManager
+    from fprime_test_sequencer.dictionaries import use_dictionaries
+    from fprime_test_sequencer.history import LocalTimeChronologicalHistory, ch_index_keys, event_index_keys
 
-def setup_integration_test_api(dictionary: str, file_storage_dir: str, tts_addr: str, tts_port: str) -> IntegrationTestAPI:
     pipeline = StandardPipeline()
+    if dictionaries != None:
+        use_dictionaries(pipeline, dictionaries)
     try:
-        pipeline.setup(config=ConfigManager(), dictionary=dictionary, file_store=file_storage_dir)
-        pipeline.connect(f"{tts_addr}:{tts_port}")
+        with profiler.phase("pipeline setup"):
+            pipeline.setup(config=ConfigManager(), dictionary=dictionary, file_store=file_storage_dir)
+        with profiler.phase("connect"):
+            pipeline.connect(f"{tts_addr}:{tts_port}")
     except Exception:
         # In all error cases, pipeline should be shutdown before continuing with exception handling
         try:
-            pipeline.disconnect()
+            disconnect(pipeline)
         finally:
             raise
 
@@ -167,23 +293,113 @@ def setup_integration_test_api(dictionary: str, file_storage_dir: str, tts_addr:
     api.setup()
 
     # Replace fprime-gds' chronological history with local time chronological history
-    api.event_history = LocalTimeChronologicalHistory()
-    api.telemetry_history = LocalTimeChronologicalHistory()
+    api.pipeline.coders.remove_event_consumer(api.event_history)
+    api.pipeline.coders.remove_channel_consumer(api.telemetry_history)
+    api.event_history = LocalTimeChronologicalHistory(event_index_keys, interest=event_interest, clock=clock)
+    api.telemetry_history = LocalTimeChronologicalHistory(ch_index_keys, interest=channel_interest, clock=clock)
     api.pipeline.coders.register_event_consumer(api.event_history)
     api.pipeline.coders.register_channel_consumer(api.telemetry_history)
 
+    # The pipeline's own histories keep everything ever received and aren't used
+    api.pipeline.coders.remove_event_consumer(api.pipeline.histories.events)
+    api.pipeline.coders.remove_channel_consumer(api.pipeline.histories.channels)
+
     return api
 
 
+def run_tests(endpoints: list[tuple[str, str]], apis: list[IntegrationTestAPI], tests: list[tuple[int, Sequence]], fail_fast: bool = False,
+              use_asyncio: bool = False, log_all: str | None = None, clock: Clock = WALL_CLOCK, profiler: Profiler = NO_PROFILER) -> int:
+    """Run tests over the connected endpoints, print a summary and return the number of tests passed."""
+    from fprime_test_sequencer.logs import LogWriter
+    from fprime_test_sequencer.parallel import EndpointRunner, distribute, run_in_parallel
+
+    starting_time = clock.time()
+    log_writer = LogWriter(log_all, starting_time, clock, profiler) if log_all is not None else None
+    runners: list[EndpointRunner] = []
+    try:
+        if len(endpoints) == 1:
+            addr, port = endpoints[0]
+            runners = [EndpointRunner(f"{addr}:{port}", apis[0], tests, fail_fast=fail_fast, use_asyncio=use_asyncio, log_writer=log_writer, clock=clock,
+                                      profiler=profiler)]
+            with profiler.phase("run"):
+                runners[0].run()
+        else:
+            print(f"Running {len(tests)} tests on {len(endpoints)} endpoints")
+            runners = [
+                EndpointRunner(f"{addr}:{port}", api, endpoint_tests, fail_fast=fail_fast, buffered=True, use_asyncio=use_asyncio, log_writer=log_writer, clock=clock,
+                               profiler=profiler)
+                for (addr, port), api, endpoint_tests in zip(endpoints, apis, distribute(tests, len(endpoints)))
+            ]
+            with profiler.phase("run"):
+                run_in_parallel(runners)
+    finally:
+        # Pipelines may outlive the run, e.g. in daemon mode
+        for runner in runners:
+            runner.close()
+        # Logs are streamed while tests run, so that they are kept even if the run is aborted
+        if log_writer is not None:
+            log_writer.close()
+            print(f"Logs written to {log_all}")
+
+    test_count = len(tests)
+    successes = sum(runner.successes for runner in runners)
+
+    if len(runners) > 1:
+        print()
+        for runner in runners:
+            print(f"{runner.endpoint}: {runner.successes}/{len(runner.tests)} tests passed")
+
+    success_rate = f" [{successes}/{test_count} TESTS PASSED ({float(successes)/float(test_count):.0%})] "
+    print(f"\n{make_green(success_rate) if successes == test_count else make_red(success_rate):=^89s}\n")
+    return successes
+
+
+def disconnect(pipeline: StandardPipeline):
+    # fprime-gds' client only notices it is stopped once data is received or its 100 s receive timeout
+    # expires, so its socket is shut down first to wake it up when the deployment is quiet
+    if pipeline.client_socket != None:
+        pipeline.client_socket.stop()
+        try:
+            pipeline.client_socket.sock.shutdown(socket.SHUT_RDWR)
+        except OSError:
+            pass
+    pipeline.disconnect()
+
+
+def get_endpoints(addrs: list[str], ports: list[str]) -> list[tuple[str, str]] | None:
+    # A single address or port is shared by all endpoints
+    if len(addrs) == 1:
+        addrs = addrs * len(ports)
+    if len(ports) == 1:
+        ports = ports * len(addrs)
+    if len(addrs) != len(ports):
+        print(f"Got {len(addrs)} addresses for {len(ports)} ports, can't pair them into endpoints")
+        return None
+    return list(zip(addrs, ports))
+
+
 def add_cli_arguments(parser: argparse.ArgumentParser):
     parser.add_argument("file", help="fpseq file from which sequences are read")
     parser.add_argument("-c", "--check", action="store_true", help="perform syntax check and print parsed sequences")
+    parser.add_argument("-w", "--watch", action="store_true", help="perform syntax check again each time the file changes and print changed sequences")
     parser.add_argument("-t", "--test", help="only run TEST")
     parser.add_argument("-d", "--dictionary", help="path to dictionary")
     parser.add_argument("--file-storage-directory", help="directory to store uplink and downlink files [default: /tmp/updown]", default="/tmp/updown")
-    parser.add_argument("--tts-addr", help="fprime-gds threaded TCP socket server address [default: 0.0.0.0]", default="0.0.0.0")
-    parser.add_argument("--tts-port", help="fprime-gds threaded TCP socket server port [default: 50050]", default="50050")
+    parser.add_argument("--tts-addr", action="append", help="fprime-gds threaded TCP socket server address, repeat to run tests in parallel on several endpoints [default: 0.0.0.0]")
+    parser.add_argument("--tts-port", action="append", help="fprime-gds threaded TCP socket server port, repeat to run tests in parallel on several endpoints [default: 50050]")
     parser.add_argument("--log-all", help="log all sent commands, received events and telemetry to given file", metavar="LOG_ALL_FILE")
+    parser.add_argument("--fail-fast", action="store_true", help="abort a test sequence as soon as one of its expectations fails")
+    parser.add_argument("--asyncio", action="store_true", help="run sequences on the asyncio execution core")
+    parser.add_argument("--no-cache", action="store_true", help="always parse the fpseq file and dictionary instead of using the sequence and dictionary caches")
+    parser.add_argument("--cache-stats", action="store_true", help="print sequence and dictionary cache statistics")
+    parser.add_argument("--replay", help="validate tests against a log recorded with --log-all instead of running them", metavar="LOG_ALL_FILE")
+    parser.add_argument("--simulate", nargs="?", const="", help="run tests against an in-process simulated deployment on a virtual clock, "
+                        "optionally scripted by a JSON file mapping command names to their responses", metavar="SCRIPT")
+    parser.add_argument("--submit", nargs="?", const="", help="submit the tests to a daemon started with fprime-test-sequencer-daemon instead of running them, "
+                        "the daemon listening on SOCKET or on its default socket", metavar="SOCKET")
+    parser.add_argument("--profile", help="write the time spent in each phase and the validation cost of each sequence to a JSON report", metavar="REPORT_FILE")
+    parser.add_argument("--profile-cpu", action="store_true", help="also profile hot paths with cProfile, statistics are written to REPORT_FILE.prof")
+    parser.add_argument("--profile-memory", action="store_true", help="also trace memory allocations with tracemalloc")
 
 
 def main():
@@ -191,11 +407,44 @@ def main():
     add_cli_arguments(parser)
     args = parser.parse_args()
 
+    if (args.profile_cpu or args.profile_memory) and args.profile is None:
+        print("--profile-cpu and --profile-memory require --profile")
+        exit()
+    profiler = Profiler(cpu=args.profile_cpu, memory=args.profile_memory) if args.profile is not None else NO_PROFILER
+
+    cache = None if args.no_cache else SequenceCache()
+
+    if args.watch:
+        watch(args.file)
+        exit()
+
     if args.check:
-        check(args.file)
+        check(args.file, cache)
+        if args.cache_stats:
+            print_cache_stats(cache)
         exit()
 
-    sequences = parse_file(args.file)
+    if args.submit is not None:
+        if args.simulate is not None or args.replay is not None or args.profile is not None:
+            print("--submit can't be combined with --simulate, --replay or --profile")
+            exit()
+        # The daemon parses the file and runs the tests on its own endpoints, with its own dictionary
+        job = Job(os.path.abspath(args.file), args.test, args.fail_fast, args.asyncio, os.path.abspath(args.log_all) if args.log_all is not None else None)
+        submit(args.submit if args.submit != "" else default_socket_path(), job)
+        exit()
+
+    with profiler.phase("parse"):
+        sequences = parse_file(args.file, cache)
+    if args.cache_stats:
+        print_cache_stats(cache)
+
+    if args.replay is not None:
+        replay(args.replay, select_tests(sequences, args.file, args.test))
+        exit()
+
+    with profiler.phase("imports"):
+        from fprime_test_sequencer.history import interest_keys
+        from fprime_test_sequencer.simulator import SimulatedDeployment
 
     if args.log_all is not None:
         dirname = os.path.dirname(args.log_all)
@@ -204,57 +453,59 @@ def main():
             exit()
         print(f"Logging commands, events and telemetry to {args.log_all}")
 
+    args.dictionary = resolve_dictionary(args.dictionary, profiler)
     if args.dictionary is None:
-        print("Automatically detecting dictionary file...")
-        args.dictionary = find_dictionary()
-        if args.dictionary is None:
-            print("Couldn't detect dictionary")
-            exit()
-    elif not os.path.exists(args.dictionary):
-        print(f"Dictionary file {args.dictionary} does not exist")
         exit()
+    dictionaries = load_dictionary(args.dictionary, args.no_cache, args.cache_stats, profiler)
 
-    print(f"Using dictionary {args.dictionary}")
-
-    api = setup_integration_test_api(str(args.dictionary), args.file_storage_directory, args.tts_addr, args.tts_port)
-
-    sequencer = Sequencer(api)
-
-    test_count = 0
-    successes = 0
-    starting_time = time.time()
-    sent_commands = []
-    uplinks = []
-    if args.test is not None:
-        if args.test not in sequences.keys():
-            print(f"No test named {args.test} in {args.file}")
+    deployment = None
+    if args.simulate is not None:
+        if args.asyncio:
+            print("The asyncio execution core can't run on a virtual clock")
             exit()
-        print()
-        success = sequencer.run_and_validate_sequence(sequences[args.test])
-        test_count = 1
-        successes = 1 if success else 0
-        sent_commands += sequences[args.test].command_instrs
-        uplinks += sequences[args.test].uplink_instrs
+        script = None
+        if args.simulate != "":
+            if not os.path.exists(args.simulate):
+                print(f"Script file {args.simulate} does not exist")
+                exit()
+            with open(args.simulate) as f:
+                script = json.load(f)
+        # Sequences run on a virtual clock shared with the simulated deployment, skipping idle time
+        clock = VirtualClock()
+        deployment = SimulatedDeployment(args.dictionary, "127.0.0.1", 0, script=script, clock=clock, dictionaries=dictionaries)
+        deployment.start()
+        addr, port = deployment.address
+        print(f"Simulating deployment on {addr}:{port}")
+        endpoints = [(addr, str(port))]
     else:
-        cumulative_seq_duration = 0
-        for sequence in sequences.values():
-            if sequence.is_test:
-                print(f"\n{test_count+1}.")
-                success = sequencer.run_and_validate_sequence(sequence)
-                test_count += 1
-                successes += 1 if success else 0
-                sent_commands += [i.with_time_offset(cumulative_seq_duration) for i in sequence.command_instrs]
-                uplinks += [u.with_time_offset(cumulative_seq_duration) for u in sequence.uplink_instrs]
-                cumulative_seq_duration += sequence.get_duration()
+        clock = WALL_CLOCK
+        endpoints = get_endpoints(args.tts_addr or ["0.0.0.0"], args.tts_port or ["50050"])
+        if endpoints is None:
+            exit()
 
-    success_rate = f" [{successes}/{test_count} TESTS PASSED ({float(successes)/float(test_count):.0%})] "
-    print(f"\n{make_green(success_rate) if successes == test_count else make_red(success_rate):=^89s}\n")
+    tests = select_tests(sequences, args.file, args.test)
 
-    if args.log_all is not None:
-        write_logs(args.log_all, api, sent_commands, uplinks, starting_time)
+    # Histories only store the events and telemetry expected by the tests to run
+    event_interest, channel_interest = interest_keys(sequence for _, sequence in tests)
+
+    try:
+        apis = connect_endpoints(endpoints, args.dictionary, dictionaries, args.file_storage_directory, event_interest, channel_interest, clock, profiler)
+    except Exception:
+        if deployment is not None:
+            deployment.stop()
+        raise
+
+    run_tests(endpoints, apis, tests, args.fail_fast, args.asyncio, args.log_all, clock, profiler)
 
-    api.pipeline.disconnect()
+    with profiler.phase("disconnect"):
+        for api in apis:
+            disconnect(api.pipeline)
+    if deployment is not None:
+        deployment.stop()
 
+    if args.profile is not None:
+        profiler.write(args.profile)
+        print(f"Profile written to {args.profile}")
 
 if __name__ == "__main__":
     main()
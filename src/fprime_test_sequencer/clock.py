@@ -0,0 +1,140 @@
+import math
+import threading
+import time
+
+
+# Real time without anything sent or received after which a virtual clock stuck on items in flight
+# advances anyway, e.g. if one was lost
+STALL_TIMEOUT_S = 1.0
+
+
+class Clock:
+    """
+    Wall clock, on which sequences run in real time.
+
+    All waits of the sequencer, the validators and the simulated deployment go through their clock,
+    on a condition they own, so that a virtual clock can tell when they are all idle.
+    """
+
+    virtual = False
+
+    def time(self) -> float:
+        return time.time()
+
+    def monotonic(self) -> float:
+        return time.perf_counter()
+
+    def wait(self, condition: threading.Condition, timeout: float | None = None):
+        """Wait on condition, whose lock is held, for up to timeout seconds."""
+        condition.wait(timeout)
+
+    def notify(self, condition: threading.Condition):
+        """Wake up the waiters of condition, whose lock is held."""
+        condition.notify_all()
+
+    def join(self):
+        """Register the calling thread as one whose waits the clock must account for."""
+
+    def leave(self):
+        pass
+
+    def sent(self, count: int = 1):
+        """Account for items sent between the sequencer and the deployment, still to be received."""
+
+    def received(self, count: int = 1):
+        pass
+
+
+WALL_CLOCK = Clock()
+
+
+class VirtualClock(Clock):
+    """
+    Clock advancing from deadline to deadline instead of in real time.
+
+    Time only advances once all participants are waiting on the clock and all items sent between
+    the sequencer and the deployment are received, to the earliest deadline of the waiters, so that
+    nothing happening in between is missed. The deployment must run on the same clock.
+    """
+
+    virtual = True
+
+    def __init__(self, start: float | None = None) -> None:
+        self.lock = threading.Lock()
+        self.now = time.time() if start == None else start
+        self.participants = 0
+        self.in_flight = 0
+        # Counts items sent and received and advances, to tell stalls from slow progress
+        self.progress = 0
+        # Idle waiters with their deadline and condition, by the event set to wake them up. Waiters are woken up
+        # through their event rather than their condition, so that no thread takes the lock of another's condition
+        self.waiters: dict[threading.Event, tuple[float, threading.Condition]] = {}
+
+    def time(self) -> float:
+        return self.now
+
+    def monotonic(self) -> float:
+        return self.now
+
+    def wait(self, condition: threading.Condition, timeout: float | None = None):
+        event = threading.Event()
+        with self.lock:
+            deadline = self.now + max(0, timeout) if timeout != None else math.inf
+            self.waiters[event] = (deadline, condition)
+            self.advance()
+        # Notifiers of condition hold its lock, so that none is missed once it's released
+        condition.release()
+        try:
+            progress = self.progress
+            while not event.wait(STALL_TIMEOUT_S):
+                with self.lock:
+                    if event in self.waiters and self.progress == progress and len(self.waiters) >= self.participants:
+                        # Nothing sent or received for a while, items still in flight were lost
+                        self.in_flight = 0
+                        self.advance()
+                    progress = self.progress
+        finally:
+            condition.acquire()
+            with self.lock:
+                self.waiters.pop(event, None)
+
+    def notify(self, condition: threading.Condition):
+        with self.lock:
+            # Waiters of condition are busy from now on
+            for event in [event for event, (_, c) in self.waiters.items() if c is condition]:
+                del self.waiters[event]
+                event.set()
+        condition.notify_all()
+
+    def join(self):
+        with self.lock:
+            self.participants += 1
+
+    def leave(self):
+        with self.lock:
+            self.participants -= 1
+            self.advance()
+
+    def sent(self, count: int = 1):
+        with self.lock:
+            self.in_flight += count
+            self.progress += 1
+
+    def received(self, count: int = 1):
+        with self.lock:
+            self.in_flight = max(0, self.in_flight - count)
+            self.progress += 1
+            self.advance()
+
+    def advance(self):
+        """If everything is idle, advance to the earliest deadline and wake up the waiters reaching it."""
+        if self.in_flight > 0 or len(self.waiters) == 0 or len(self.waiters) < self.participants:
+            return
+        deadline = min(deadline for deadline, _ in self.waiters.values())
+        if deadline == math.inf:
+            return
+        self.now = max(self.now, deadline)
+        self.progress += 1
+        for event in [event for event, (deadline, _) in self.waiters.items() if deadline <= self.now]:
+            del self.waiters[event]
+            event.set()
@@ -0,0 +1,201 @@
+import argparse
+import contextlib
+import io
+import os
+import queue
+import signal
+import socketserver
+import sys
+import threading
+import traceback
+from dataclasses import dataclass, field
+from typing import BinaryIO
+
+from fprime_gds.common.testing_fw.api import IntegrationTestAPI
+from fprime_test_sequencer.cache import SequenceCache
+from fprime_test_sequencer.cli import connect_endpoints, disconnect, get_endpoints, load_dictionary, parse_file, resolve_dictionary, run_tests, select_tests
+from fprime_test_sequencer.history import interest_keys
+from fprime_test_sequencer.jobs import Job, default_socket_path, is_listening, read_message, write_message
+from fprime_test_sequencer.util import make_red
+
+
+class JobOutput(io.TextIOBase):
+    """Standard output of a running job, streamed to the client which submitted it."""
+
+    def __init__(self, wfile: BinaryIO) -> None:
+        self.wfile = wfile
+        self.lock = threading.Lock()
+        self.connected = True
+
+    def send(self, message: dict):
+        with self.lock:
+            if not self.connected:
+                return
+            try:
+                write_message(self.wfile, message)
+            except OSError:
+                # The client went away, the job still runs to the end so that the endpoints are left idle
+                self.connected = False
+
+    def writable(self) -> bool:
+        return True
+
+    def write(self, text: str) -> int:
+        if text != "":
+            self.send({"output": text})
+        return len(text)
+
+
+@dataclass
+class PendingJob:
+    job: Job
+    output: JobOutput
+    done: threading.Event = field(default_factory=threading.Event)
+    tests: int = 0
+    successes: int = 0
+
+
+class JobHandler(socketserver.StreamRequestHandler):
+    def handle(self):
+        daemon: SequencerDaemon = self.server.sequencer_daemon
+        output = JobOutput(self.wfile)
+        try:
+            job = Job(**read_message(self.rfile))
+        except (TypeError, ValueError):
+            output.send({"output": "Malformed job\n"})
+            return
+        pending = daemon.submit(job, output)
+        pending.done.wait()
+        output.send({"tests": pending.tests, "successes": pending.successes})
+
+
+class SequencerDaemon:
+    """
+    Keeps test APIs connected to the endpoints and runs the jobs submitted on a Unix socket, one
+    after the other as they share the endpoints. Before each job, the histories are cleared and only
+    store the items expected by the job's tests from then on. The output of each job is streamed
+    back to the client which submitted it.
+    """
+
+    def __init__(self, socket_path: str, endpoints: list[tuple[str, str]], apis: list[IntegrationTestAPI], cache: SequenceCache | None = None) -> None:
+        self.socket_path = socket_path
+        self.endpoints = endpoints
+        self.apis = apis
+        self.cache = cache
+        self.lock = threading.Lock()
+        self.jobs: queue.Queue[PendingJob] = queue.Queue()
+        self.running = False
+        self.server = socketserver.ThreadingUnixStreamServer(socket_path, JobHandler)
+        self.server.daemon_threads = True
+        self.server.sequencer_daemon = self
+        self.worker = threading.Thread(target=self.run_jobs, name="job worker", daemon=True)
+
+    def submit(self, job: Job, output: JobOutput) -> PendingJob:
+        pending = PendingJob(job, output)
+        with self.lock:
+            # Sent before queuing, so that it comes before the output of the job
+            output.send({"queued": self.jobs.qsize() + (1 if self.running else 0)})
+            self.jobs.put(pending)
+        return pending
+
+    def serve_forever(self):
+        self.worker.start()
+        self.server.serve_forever()
+
+    def close(self):
+        self.server.server_close()
+        with contextlib.suppress(FileNotFoundError):
+            os.unlink(self.socket_path)
+
+    def run_jobs(self):
+        while True:
+            pending = self.jobs.get()
+            with self.lock:
+                self.running = True
+            print(f"Running {pending.job.file}", file=sys.stderr)
+            try:
+                # Jobs run one at a time, so everything printed while one runs is its output
+                with contextlib.redirect_stdout(pending.output):
+                    pending.tests, pending.successes = self.run_job(pending.job)
+            except Exception as e:
+                traceback.print_exc()
+                pending.output.write(make_red(f"Job failed: {e}") + "\n")
+            finally:
+                with self.lock:
+                    self.running = False
+                pending.done.set()
+
+    def run_job(self, job: Job) -> tuple[int, int]:
+        """Run the tests of job, return the number of tests run and passed."""
+        try:
+            sequences = parse_file(job.file, self.cache)
+            tests = select_tests(sequences, job.file, job.test)
+        except SystemExit:
+            # Parsing and test selection errors are printed before exiting
+            return 0, 0
+        if len(tests) == 0:
+            print(f"No tests in {job.file}")
+            return 0, 0
+
+        event_interest, channel_interest = interest_keys(sequence for _, sequence in tests)
+        for api in self.apis:
+            api.command_history.clear()
+            for history, interest in ((api.event_history, event_interest), (api.telemetry_history, channel_interest)):
+                history.interest = interest
+                history.clear()
+
+        return len(tests), run_tests(self.endpoints, self.apis, tests, job.fail_fast, job.use_asyncio, job.log_all)
+
+
+def stop(signum, frame):
+    raise KeyboardInterrupt
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Keep connected to fprime-gds endpoints and run the tests submitted with fprime-test-sequencer --submit")
+    parser.add_argument("--socket", default=default_socket_path(), help=f"Unix socket on which jobs are submitted [default: {default_socket_path()}]")
+    parser.add_argument("-d", "--dictionary", help="path to dictionary")
+    parser.add_argument("--file-storage-directory", help="directory to store uplink and downlink files [default: /tmp/updown]", default="/tmp/updown")
+    parser.add_argument("--tts-addr", action="append", help="fprime-gds threaded TCP socket server address, repeat to run tests in parallel on several endpoints [default: 0.0.0.0]")
+    parser.add_argument("--tts-port", action="append", help="fprime-gds threaded TCP socket server port, repeat to run tests in parallel on several endpoints [default: 50050]")
+    parser.add_argument("--no-cache", action="store_true", help="always parse fpseq files and the dictionary instead of using the sequence and dictionary caches")
+    args = parser.parse_args()
+
+    if os.path.exists(args.socket):
+        if is_listening(args.socket):
+            print(f"A daemon is already listening on {args.socket}")
+            exit()
+        # Left over by a daemon which didn't exit cleanly
+        os.unlink(args.socket)
+
+    dictionary = resolve_dictionary(args.dictionary)
+    if dictionary is None:
+        exit()
+    dictionaries = load_dictionary(dictionary, args.no_cache)
+    endpoints = get_endpoints(args.tts_addr or ["0.0.0.0"], args.tts_port or ["50050"])
+    if endpoints is None:
+        exit()
+
+    # Histories store nothing until the first job sets what its tests expect
+    apis = connect_endpoints(endpoints, dictionary, dictionaries, args.file_storage_directory, set(), set())
+    try:
+        daemon = SequencerDaemon(args.socket, endpoints, apis, None if args.no_cache else SequenceCache())
+    except Exception:
+        for api in apis:
+            disconnect(api.pipeline)
+        raise
+    # Service managers stop daemons with SIGTERM, handled as Ctrl-C
+    signal.signal(signal.SIGTERM, stop)
+    print(f"Connected to {', '.join(f'{addr}:{port}' for addr, port in endpoints)}, listening for jobs on {args.socket}, press Ctrl-C to stop")
+    try:
+        daemon.serve_forever()
+    except KeyboardInterrupt:
+        pass
+    finally:
+        daemon.close()
+        for api in apis:
+            disconnect(api.pipeline)
+
+
+if __name__ == "__main__":
+    main()
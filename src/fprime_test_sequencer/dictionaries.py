@@ -0,0 +1,136 @@
+import contextlib
+import hashlib
+import os
+import pickle
+import tempfile
+from importlib.metadata import PackageNotFoundError, version
+from pathlib import Path
+
+from fprime.common.models.serialize.type_base import DictionaryType
+from fprime_gds.common.pipeline.dictionaries import Dictionaries
+from fprime_gds.common.pipeline.standard import StandardPipeline
+
+from fprime_test_sequencer.cache import MAX_ENTRIES, default_cache_dir, stat_entries, tool_version
+
+
+def construct_type(parent_class: type, name: str, properties: dict) -> type:
+    return DictionaryType.construct_type(parent_class, name, **properties)
+
+
+class DictionaryPickler(pickle.Pickler):
+    """
+    Pickler of loaded dictionaries. The string, enum, array and serializable types fprime-gds generates
+    from dictionaries can't be looked up by name, they are pickled as calls generating them again.
+    """
+
+    def reducer_override(self, obj):
+        if isinstance(obj, type) and issubclass(obj, DictionaryType):
+            construct, properties = DictionaryType._CONSTRUCTS.get(obj.__name__, (None, None))
+            if construct is obj:
+                return construct_type, (obj.__base__, obj.__name__, properties)
+        return NotImplemented
+
+
+def gds_version() -> str:
+    try:
+        return version("fprime-gds")
+    except PackageNotFoundError:
+        return "unknown"
+
+
+class DictionaryCache:
+    """
+    On-disk cache of loaded dictionaries, keyed by dictionary path, tool and fprime-gds versions.
+
+    Entries are stamped with the mtime and size of the dictionary they were loaded from, along with a
+    digest of its content: a dictionary is only hashed again when its stamp changed, and only loaded
+    again when its content changed.
+    """
+
+    def __init__(self, directory: Path | None = None) -> None:
+        self.directory = Path(directory) if directory != None else default_cache_dir() / "dictionaries"
+        self.hits = 0
+        self.misses = 0
+
+    def key(self, dictionary: Path) -> str:
+        digest = hashlib.sha256(f"{tool_version()}\0{gds_version()}\0".encode())
+        digest.update(str(dictionary.resolve()).encode())
+        return digest.hexdigest()
+
+    def path(self, key: str) -> Path:
+        return self.directory / f"{key}.pickle"
+
+    def load(self, dictionary: Path) -> Dictionaries | None:
+        path = self.path(self.key(dictionary))
+        try:
+            stat = dictionary.stat()
+            with open(path, 'rb') as f:
+                stamp, content_digest = pickle.load(f)
+                if stamp != (stat.st_mtime_ns, stat.st_size) and content_digest != hashlib.sha256(dictionary.read_bytes()).hexdigest():
+                    raise ValueError("Dictionary changed")
+                dictionaries = pickle.load(f)
+        except Exception:
+            # Missing, unreadable, corrupted or outdated entries are all cache misses
+            self.misses += 1
+            return None
+        if stamp != (stat.st_mtime_ns, stat.st_size):
+            # Touched but unchanged, stamped again so that it isn't hashed on every load
+            self.store(dictionary, dictionaries)
+        else:
+            # Keep recently used entries from being pruned, unless another process just pruned it
+            with contextlib.suppress(OSError):
+                os.utime(path)
+        self.hits += 1
+        return dictionaries
+
+    def store(self, dictionary: Path, dictionaries: Dictionaries):
+        try:
+            stat = dictionary.stat()
+            content_digest = hashlib.sha256(dictionary.read_bytes()).hexdigest()
+            self.directory.mkdir(parents=True, exist_ok=True)
+            fd, tmp_file = tempfile.mkstemp(dir=self.directory, suffix=".tmp")
+            with os.fdopen(fd, 'wb') as f:
+                pickle.dump(((stat.st_mtime_ns, stat.st_size), content_digest), f, protocol=pickle.HIGHEST_PROTOCOL)
+                DictionaryPickler(f, protocol=pickle.HIGHEST_PROTOCOL).dump(dictionaries)
+            os.replace(tmp_file, self.path(self.key(dictionary)))
+            self.prune()
+        except (OSError, pickle.PicklingError) as e:
+            print(f"Couldn't write to dictionary cache: {e}")
+
+    def entries(self) -> list[Path]:
+        return list(self.directory.glob("*.pickle")) if self.directory.exists() else []
+
+    def prune(self):
+        entries = sorted(stat_entries(self.entries()), key=lambda e: e[1].st_mtime, reverse=True)
+        for entry, _ in entries[MAX_ENTRIES:]:
+            entry.unlink(missing_ok=True)
+
+    def stats(self) -> str:
+        entries = stat_entries(self.entries())
+        size = sum(stat.st_size for _, stat in entries)
+        return (
+            f"Dictionary cache: {self.hits} hit(s), {self.misses} miss(es), "
+            f"{len(entries)} entries ({size / 1000:.1f} kB) in {self.directory}"
+        )
+
+
+def load_dictionaries(dictionary: str, cache: DictionaryCache | None = None) -> tuple[Dictionaries, bool]:
+    """Load dictionary, from the cache if given and up to date. Return the dictionaries and whether they were cached."""
+    if cache != None and (dictionaries := cache.load(Path(dictionary))) != None:
+        return dictionaries, True
+    dictionaries = Dictionaries()
+    dictionaries.load_dictionaries(dictionary, None)
+    if cache != None:
+        cache.store(Path(dictionary), dictionaries)
+    return dictionaries, False
+
+
+def use_dictionaries(pipeline: StandardPipeline, dictionaries: Dictionaries):
+    """Make pipeline use already loaded dictionaries instead of loading its dictionary again on setup."""
+    def load(dictionary, packet_spec):
+        if packet_spec != None:
+            Dictionaries.load_dictionaries(pipeline.dictionaries, dictionary, packet_spec)
+        else:
+            vars(pipeline.dictionaries).update(vars(dictionaries))
+
+    pipeline.dictionaries.load_dictionaries = load
@@ -0,0 +1,151 @@
+import bisect
+from typing import Callable, Iterable
+
+from fprime_gds.common.data_types.ch_data import ChData
+from fprime_gds.common.data_types.event_data import EventData
+from fprime_gds.common.history.chrono import ChronologicalHistory
+from fprime_test_sequencer.clock import WALL_CLOCK, Clock
+from fprime_test_sequencer.parser.parser import Sequence
+from fprime_test_sequencer.parser.predicates import numeric_column, parse_number
+
+
+# Number of stored items between two evictions of the items older than the retention horizon
+EVICTION_PERIOD = 1000
+
+
+def event_index_keys(ed: EventData) -> list[str]:
+    return [ed.template.get_full_name(), str(ed.get_severity())]
+
+
+def ch_index_keys(cd: ChData) -> list[str]:
+    return [cd.template.get_full_name()]
+
+
+def interest_keys(sequences: Iterable[Sequence]) -> tuple[set[str], set[str]]:
+    """Return the event names and severities, and the channel names expected by the given sequences."""
+    sequences = list(sequences)
+    event_keys = {ei.event for seq in sequences for ei in seq.event_instrs}
+    channel_keys = {ti.channel for seq in sequences for ti in seq.telemetry_instrs}
+    return event_keys, channel_keys
+
+
+class HistoryIndex:
+    """
+    Time-sorted buckets of history items, keyed by event/channel name or severity.
+
+    The numeric values of a bucket are parsed into a column on demand, to evaluate numeric
+    predicates over whole windows at once, and kept until the bucket changes.
+    """
+
+    def __init__(self) -> None:
+        self.buckets: dict[str, tuple[list[float], list]] = {}
+        self.value_columns: dict[str, object] = {}
+
+    def add(self, key: str, time_s: float, item) -> None:
+        times, items = self.buckets.setdefault(key, ([], []))
+        # Items are stamped on reception so this is almost always an append
+        idx = bisect.bisect_right(times, time_s)
+        times.insert(idx, time_s)
+        items.insert(idx, item)
+        if self.value_columns:
+            self.value_columns.pop(key, None)
+
+    def span(self, key: str, start_s: float, end_s: float) -> tuple[int, int]:
+        """Return the slice of bucket key received in [start_s, end_s]."""
+        if key not in self.buckets:
+            return 0, 0
+        times, _ = self.buckets[key]
+        return bisect.bisect_left(times, start_s), bisect.bisect_right(times, end_s)
+
+    def window(self, key: str, start_s: float, end_s: float) -> list:
+        """Return the items of bucket key received in [start_s, end_s], in chronological order."""
+        start, end = self.span(key, start_s, end_s)
+        return self.items(key)[start:end]
+
+    def items(self, key: str) -> list:
+        return self.buckets[key][1] if key in self.buckets else []
+
+    def numeric_values(self, key: str):
+        """Return the numeric values of the items of bucket key, NaN for non numeric ones, as a column."""
+        if key not in self.value_columns:
+            self.value_columns[key] = numeric_column([parse_number(str(item.get_display_text())) for item in self.items(key)])
+        return self.value_columns[key]
+
+    def evict(self, time_s: float) -> None:
+        """Remove the items received before time_s."""
+        self.value_columns.clear()
+        for key in list(self.buckets.keys()):
+            times, items = self.buckets[key]
+            idx = bisect.bisect_left(times, time_s)
+            del times[:idx]
+            del items[:idx]
+            if len(times) == 0:
+                del self.buckets[key]
+
+    def clear(self) -> None:
+        self.buckets.clear()
+        self.value_columns.clear()
+
+
+class LocalTimeChronologicalHistory(ChronologicalHistory):
+    """
+    A chronological history which replaces remote sending times with local reception times
+    and indexes received items by the keys returned by index_keys.
+
+    If an interest set is given, only items with at least one key in the set are stored, the others
+    being only counted. If a retention horizon is given, stored items received before the horizon
+    are periodically evicted, as they can't satisfy any expectation anymore.
+    """
+
+    def __init__(self, index_keys: Callable[[object], list[str]], filter_pred=None, interest: set[str] | None=None, clock: Clock=WALL_CLOCK) -> None:
+        super().__init__(filter_pred)
+        self.index_keys = index_keys
+        self.clock = clock
+        self.index = HistoryIndex()
+        self.interest = interest
+        self.horizon: Callable[[], float] | None = None
+        self.ignored = 0
+        self.evicted = 0
+        self.stored_since_eviction = 0
+
+    def retain_from(self, horizon: Callable[[], float] | None):
+        """Evict items received before the time returned by horizon."""
+        self.horizon = horizon
+
+    def data_callback(self, data, sender=None):
+        if self.filter(data):
+            # Always stamped, as consumers registered after the history rely on local reception times
+            data.time.set_float(self.clock.time())
+            keys = self.index_keys(data)
+            if self.interest != None and self.interest.isdisjoint(keys):
+                self.ignored += 1
+                return
+            time_s = data.get_time().get_float()
+            # Bisect insertion instead of ChronologicalHistory's linear scan of the whole history
+            bisect.insort_right(self.new_objects, data, key=lambda d: d.get_time().get_float())
+            idx = bisect.bisect_right(self.objects, time_s, key=lambda d: d.get_time().get_float())
+            self.objects.insert(idx, data)
+            self.retrieved_cursor = min(idx, self.retrieved_cursor)
+            for key in keys:
+                self.index.add(key, time_s, data)
+
+            self.stored_since_eviction += 1
+            if self.horizon != None and self.stored_since_eviction >= EVICTION_PERIOD:
+                self.evict(self.horizon())
+
+    def evict(self, time_s: float):
+        """Remove the items received before time_s."""
+        self.stored_since_eviction = 0
+        idx = bisect.bisect_left(self.objects, time_s, key=lambda d: d.get_time().get_float())
+        del self.objects[:idx]
+        self.retrieved_cursor = max(0, self.retrieved_cursor - idx)
+        del self.new_objects[:bisect.bisect_left(self.new_objects, time_s, key=lambda d: d.get_time().get_float())]
+        self.index.evict(time_s)
+        self.evicted += idx
+
+    def clear(self, start=None):
+        super().clear(start)
+        self.index.clear()
+        for data in self.objects:
+            for key in self.index_keys(data):
+                self.index.add(key, data.get_time().get_float(), data)
@@ -0,0 +1,80 @@
+import json
+import os
+import socket
+import sys
+import tempfile
+from dataclasses import asdict, dataclass
+from typing import BinaryIO
+
+# Jobs are submitted to a daemon started with fprime-test-sequencer-daemon by the command line entry point,
+# which must not import fprime-gds for that, so this module doesn't either.
+#
+# Messages are JSON objects, one per line. The client sends a job, the daemon answers with the number of
+# jobs queued before it, then streams the output of the run and ends with the number of tests passed:
+#
+#   {"file": "/abs/tests.fpseq", "test": null, "fail_fast": false, "use_asyncio": false, "log_all": null}
+#   {"queued": 0}
+#   {"output": "..."}
+#   {"tests": 3, "successes": 3}
+
+
+@dataclass
+class Job:
+    """Run of the tests of an fpseq file on the endpoints of a daemon, with paths absolute."""
+    file: str
+    test: str | None = None
+    fail_fast: bool = False
+    use_asyncio: bool = False
+    log_all: str | None = None
+
+
+def default_socket_path() -> str:
+    runtime_dir = os.environ.get("XDG_RUNTIME_DIR", tempfile.gettempdir())
+    return os.path.join(runtime_dir, f"fprime-test-sequencer-{os.getuid()}.sock")
+
+
+def write_message(f: BinaryIO, message: dict):
+    f.write(json.dumps(message).encode() + b"\n")
+    f.flush()
+
+
+def read_message(f: BinaryIO) -> dict | None:
+    """Return the next message, None once the connection is closed."""
+    line = f.readline()
+    return json.loads(line) if line != b"" else None
+
+
+def is_listening(socket_path: str) -> bool:
+    with socket.socket(socket.AF_UNIX, socket.SOCK_STREAM) as sock:
+        try:
+            sock.connect(socket_path)
+            return True
+        except OSError:
+            return False
+
+
+def submit(socket_path: str, job: Job) -> tuple[int, int] | None:
+    """
+    Submit job to the daemon listening on socket_path and print its output as it runs. Return the
+    number of tests run and passed, None if the daemon couldn't be reached or went away.
+    """
+    try:
+        sock = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
+        sock.connect(socket_path)
+    except OSError as e:
+        print(f"Couldn't connect to daemon on {socket_path}: {e}")
+        return None
+
+    with sock, sock.makefile("rwb") as f:
+        write_message(f, asdict(job))
+        while (message := read_message(f)) != None:
+            if "output" in message:
+                sys.stdout.write(message["output"])
+                sys.stdout.flush()
+            elif "queued" in message and message["queued"] > 0:
+                print(f"Queued behind {message['queued']} job(s)", flush=True)
+            elif "tests" in message:
+                return message["tests"], message["successes"]
+
+    print("Daemon closed the connection before the end of the job")
+    return None
@@ -0,0 +1,100 @@
+import heapq
+import itertools
+import threading
+
+from fprime_gds.common.data_types.ch_data import ChData
+from fprime_gds.common.data_types.event_data import EventData
+from fprime_test_sequencer.clock import WALL_CLOCK, Clock
+from fprime_test_sequencer.parser.parser import CommandInstruction
+from fprime_test_sequencer.profiler import NO_PROFILER, Profiler
+from fprime_test_sequencer.scheduler import Dispatch
+from fprime_test_sequencer.util import ch_data_to_str, event_data_to_str, time_to_relative_ms
+from fprime_test_sequencer.validator import Consumer
+
+
+# Entries are held back this long to be written in order, even if they are added slightly out of order
+REORDER_WINDOW_S = 0.5
+FLUSH_PERIOD_S = 1.0
+MAX_PENDING_ENTRIES = 10000
+
+
+class LogWriter:
+    """
+    Streams sent commands, uplinks, received events and telemetry to a log file while tests run.
+
+    Entries are added from several threads, by the pipeline consumers and by the schedulers, and kept
+    in a heap until they are older than the reorder window, so that they are written sorted by time
+    with bounded memory. The file is flushed periodically, so that the log survives an abort.
+    """
+
+    def __init__(self, filename: str, starting_time: float, clock: Clock = WALL_CLOCK, profiler: Profiler = NO_PROFILER) -> None:
+        self.file = open(filename, 'w')
+        self.clock = clock
+        self.profiler = profiler
+        self.to_ms = time_to_relative_ms(starting_time)
+        self.lock = threading.Lock()
+        self.pending: list[tuple[float, int, str]] = []
+        # Keeps entries with the same time in the order they were added
+        self.counter = itertools.count()
+        self.closed = threading.Event()
+        self.flusher = threading.Thread(target=self.run, name="log writer", daemon=True)
+        self.flusher.start()
+
+    def add(self, time_s: float, text: str):
+        with self.lock, self.profiler.phase("log writing"):
+            if self.file.closed:
+                return
+            heapq.heappush(self.pending, (time_s, next(self.counter), text))
+            self.write_until(self.clock.time() - REORDER_WINDOW_S)
+
+    def write_until(self, time_s: float):
+        """Write pending entries older than time_s, and the oldest ones beyond the pending limit."""
+        lines = []
+        while len(self.pending) > 0 and (self.pending[0][0] < time_s or len(self.pending) > MAX_PENDING_ENTRIES):
+            entry_time, _, text = heapq.heappop(self.pending)
+            lines.append(f"[{self.to_ms(entry_time)} ms] {text}\n")
+        self.file.writelines(lines)
+
+    def run(self):
+        while not self.closed.wait(FLUSH_PERIOD_S):
+            with self.lock, self.profiler.phase("log writing"):
+                self.write_until(self.clock.time() - REORDER_WINDOW_S)
+                self.file.flush()
+
+    def close(self):
+        self.closed.set()
+        self.flusher.join()
+        with self.lock, self.profiler.phase("log writing"):
+            self.write_until(float("inf"))
+            self.file.close()
+
+    def consumers(self, tag: str = "") -> tuple[Consumer, Consumer]:
+        """
+        Return the event and channel consumers logging received items, prefixed with tag. They must be
+        registered after the local time histories, so that items are stamped with their reception time.
+        """
+        def log_event(ed: EventData):
+            self.add(ed.get_time().get_float(), f"{tag}EVENT {event_data_to_str(ed, with_timing=False)}")
+
+        def log_channel(cd: ChData):
+            self.add(cd.get_time().get_float(), f"{tag}TELEMETRY {ch_data_to_str(cd, with_timing=False)}")
+
+        return Consumer(log_event), Consumer(log_channel)
+
+    def start_listener(self, tag: str = ""):
+        """Return a scheduler start listener logging the start of each test, prefixed with tag."""
+        def log_start(name: str, starting_time: float):
+            self.add(starting_time, f"{tag}TEST {name}")
+
+        return log_start
+
+    def dispatch_listener(self, tag: str = ""):
+        """Return a scheduler listener logging dispatched commands and uplinks, prefixed with tag."""
+        def log_dispatch(dispatch: Dispatch):
+            instr = dispatch.instr
+            if isinstance(instr, CommandInstruction):
+                self.add(dispatch.time, f"{tag}COMMAND {instr.command} {' '.join(instr.args)}")
+            else:
+                self.add(dispatch.time, f"{tag}UPLINK {instr.file} {instr.dest}")
+
+        return log_dispatch
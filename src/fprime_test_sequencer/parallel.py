@@ -0,0 +1,135 @@
+import asyncio
+import heapq
+import io
+import threading
+
+from fprime_gds.common.testing_fw.api import IntegrationTestAPI
+from fprime_test_sequencer.async_sequencer import AsyncSequencer
+from fprime_test_sequencer.clock import WALL_CLOCK, Clock
+from fprime_test_sequencer.logs import LogWriter
+from fprime_test_sequencer.parser.parser import Sequence
+from fprime_test_sequencer.profiler import NO_PROFILER, Profiler
+from fprime_test_sequencer.sequencer import Sequencer
+from fprime_test_sequencer.validator import Consumer
+
+
+# Serializes the reports of all runners on the standard output
+OUTPUT_LOCK = threading.Lock()
+
+
+def distribute(tests: list[tuple[int, Sequence]], nb_endpoints: int) -> list[list[tuple[int, Sequence]]]:
+    """Distribute numbered tests over endpoints, longest first, each to the least loaded endpoint."""
+    loads = [(0, idx) for idx in range(nb_endpoints)]
+    assignments: list[list[tuple[int, Sequence]]] = [[] for _ in range(nb_endpoints)]
+    for number, sequence in sorted(tests, key=lambda t: t[1].get_duration(), reverse=True):
+        load, idx = heapq.heappop(loads)
+        assignments[idx].append((number, sequence))
+        heapq.heappush(loads, (load + sequence.get_duration(), idx))
+    return assignments
+
+
+class EndpointRunner:
+    """
+    Runs tests one after the other on a single GDS endpoint.
+
+    When buffered, the output of each test is printed as a single block once the test is over, so
+    that runners of several endpoints can run in parallel without interleaving their reports.
+    """
+
+    def __init__(self, endpoint: str, api: IntegrationTestAPI, tests: list[tuple[int, Sequence]], fail_fast: bool=False, buffered: bool=False, use_asyncio: bool=False,
+                 log_writer: LogWriter | None=None, clock: Clock=WALL_CLOCK, profiler: Profiler=NO_PROFILER) -> None:
+        self.endpoint = endpoint
+        self.api = api
+        self.tests = tests
+        self.buffered = buffered
+        self.use_asyncio = use_asyncio
+        self.clock = clock
+        self.profiler = profiler
+        self.sequencer = AsyncSequencer(api, fail_fast=fail_fast) if use_asyncio else Sequencer(api, fail_fast=fail_fast, clock=clock, profiler=profiler)
+        self.successes = 0
+        # Exception raised by the runner thread, raised again once all runners are done
+        self.error: BaseException | None = None
+        # Event and channel consumers registered on the pipeline, removed once closed
+        self.consumers: list[tuple[Consumer, Consumer]] = []
+        if log_writer != None:
+            # Tag entries with their endpoint when several endpoints log to the same file
+            tag = f"[{endpoint}] " if buffered else ""
+            self.register(*log_writer.consumers(tag))
+            self.sequencer.scheduler.start_listeners.append(log_writer.start_listener(tag))
+            self.sequencer.scheduler.listeners.append(log_writer.dispatch_listener(tag))
+        if clock.virtual:
+            # Registered last, so that received items are accounted for once handled by all other consumers
+            received = Consumer(lambda _: clock.received())
+            self.register(received, received)
+            api.pipeline.distributor.register("FW_PACKET_HAND", received)
+            # The uplinker only records the handshake it expects once done sending a packet, and ignores any arriving
+            # before, so time must not advance to the handshake until then
+            uplinker = api.pipeline.files.uplinker
+            send = uplinker.send
+
+            def send_file_packet(packet_data):
+                clock.sent()
+                try:
+                    send(packet_data)
+                finally:
+                    clock.received()
+
+            uplinker.send = send_file_packet
+        self.thread = threading.Thread(target=self.run_thread, name=f"runner {endpoint}", daemon=True)
+
+    def register(self, event_consumer: Consumer, channel_consumer: Consumer):
+        self.api.pipeline.coders.register_event_consumer(event_consumer)
+        self.api.pipeline.coders.register_channel_consumer(channel_consumer)
+        self.consumers.append((event_consumer, channel_consumer))
+
+    def close(self):
+        """Remove the consumers registered on the pipeline, so that other runners can use it."""
+        self.sequencer.close()
+        for event_consumer, channel_consumer in self.consumers:
+            self.api.pipeline.coders.remove_event_consumer(event_consumer)
+            self.api.pipeline.coders.remove_channel_consumer(channel_consumer)
+        self.consumers = []
+
+    def run(self):
+        self.clock.join()
+        try:
+            self.profiler.hot(self.run_tests)()
+        finally:
+            self.clock.leave()
+
+    def run_thread(self):
+        try:
+            self.run()
+        except BaseException as e:
+            self.error = e
+
+    def run_tests(self):
+        for number, sequence in self.tests:
+            if self.buffered:
+                output = io.StringIO()
+                self.sequencer.redirect(output)
+            else:
+                print(f"\n{number}.")
+
+            if self.use_asyncio:
+                success = asyncio.run(self.sequencer.run_and_validate_sequence(sequence))
+            else:
+                success = self.sequencer.run_and_validate_sequence(sequence)
+
+            if self.buffered:
+                with OUTPUT_LOCK:
+                    print(f"\n{number}. [{self.endpoint}]")
+                    print(output.getvalue(), end="", flush=True)
+
+            self.successes += 1 if success else 0
+
+
+def run_in_parallel(runners: list[EndpointRunner]):
+    for runner in runners:
+        runner.thread.start()
+    for runner in runners:
+        runner.thread.join()
+    # Other runners are left to finish their tests, the tests the failed runner didn't run are neither passed nor failed
+    for runner in runners:
+        if runner.error != None:
+            raise runner.error
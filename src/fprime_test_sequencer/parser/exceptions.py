@@ -14,3 +14,7 @@ class ParseError(Exception):
             f"  {' ' * (self.offset - 1)}^\n"
             f"Parsing error: {self.error}"
         )
+
+
+class LoadError(Exception):
+    """Error reading the files imported by a source."""
@@ -0,0 +1,156 @@
+from fprime_test_sequencer.parser.exceptions import LoadError, ParseError
+from fprime_test_sequencer.parser.loader import Block, Loader, read_block
+from fprime_test_sequencer.parser.parser import Parser, RunSeqInstruction, Sequence
+from dataclasses import dataclass, field
+import contextlib
+import io
+import re
+import time
+
+
+# SEQ instructions are the only ones at the top level, each starts a block of lines read on its own.
+# Matching the newline before them first is much faster than matching at the start of each line.
+SEQ_PATTERN = re.compile(r"\n(?=(?:TEST +)?SEQ(?![\w.]))")
+
+
+@dataclass
+class ParseUpdate:
+    """Result of parsing a new version of the source."""
+    sequences: dict[str, Sequence] | None
+    error: str | None = None
+    flattened: list[str] = field(default_factory=list)
+    removed: list[str] = field(default_factory=list)
+    blocks: int = 0
+    parsed_blocks: int = 0
+    parse_time: float = 0.0
+    flatten_time: float = 0.0
+
+
+def split_blocks(source: str) -> list[str]:
+    """Split source before each SEQ instruction, the first block also holding the lines before the first sequence."""
+    starts = [0] + [match_.end() for match_ in SEQ_PATTERN.finditer(source)] + [len(source)]
+    return [source[start:end] for start, end in zip(starts, starts[1:])]
+
+
+class IncrementalParser:
+    """
+    Parser of successive versions of a source, as it is edited.
+
+    Sequences only depend on the lines from their SEQ instruction up to the next one, so the source is
+    split into blocks of lines which are only read again when their text changed. Flattened sequences
+    are kept from one version to the next, only the changed sequences and those running them, directly
+    or not, are flattened again. Imported files are only read again when they changed.
+    """
+
+    def __init__(self, filename: str) -> None:
+        self.filename = filename
+        self.parser = Parser(None)
+        self.blocks: dict[str, Block] = {}
+        self.loader = Loader()
+        self.library: list[Block] = []
+        # Sequences running each sequence, along with the number of RUNSEQ instructions doing so
+        self.includers: dict[str, dict[str, int]] = {}
+        self.flattened: dict[str, Sequence] = {}
+        self.bounded: dict[str, Sequence] = {}
+
+    def update(self, source: str) -> ParseUpdate:
+        start = time.perf_counter()
+        texts = split_blocks(source)
+        blocks: dict[str, Block] = {}
+        parsed: list[Block] = []
+        for text in texts:
+            if text not in blocks:
+                if (block := self.blocks.get(text)) == None:
+                    block = read_block(self.filename, text)
+                    parsed += [block]
+                blocks[text] = block
+        removed_blocks = [block for text, block in self.blocks.items() if text not in blocks]
+        self.blocks = blocks
+
+        error = None
+        offset = 0
+        for text in texts:
+            block = blocks[text]
+            if block.error != None:
+                if isinstance(block.error, ParseError):
+                    pe = block.error
+                    line_no = pe.line_no + source.count("\n", 0, offset)
+                    error = str(ParseError(pe.filename, line_no, pe.offset, pe.source, pe.error))
+                else:
+                    error = block.error.rstrip("\n")
+                break
+            offset += len(text)
+
+        # Imported files are only read again when they changed, and kept as they were while the source has errors
+        library = self.library
+        if error == None:
+            try:
+                library = self.loader.load(self.filename, [path for text in texts for path in blocks[text].imports])
+            except LoadError as e:
+                error = str(e)
+                library = []
+        # Files read again are new blocks, unchanged ones are the blocks already read
+        kept = {id(block) for block in library} & {id(block) for block in self.library}
+        added_files = [block for block in library if id(block) not in kept]
+        removed_files = [block for block in self.library if id(block) not in kept]
+        self.library = library
+
+        # Blocks are assembled in order after the imported files, so that later definitions of a sequence
+        # override earlier ones as when parsed at once
+        sequences: dict[str, Sequence] = {}
+        runseqs: dict[str, list[RunSeqInstruction]] = {}
+        for block in library + [blocks[text] for text in texts]:
+            sequences.update(block.sequences)
+            runseqs.update(block.runseqs)
+        parse_time = time.perf_counter() - start
+
+        start = time.perf_counter()
+        removed = [seq_name for seq_name in self.bounded if seq_name not in sequences]
+        for block in removed_blocks + removed_files:
+            self.count_includes(block, -1)
+        for block in parsed + added_files:
+            self.count_includes(block, 1)
+        self.invalidate({seq_name for block in parsed + removed_blocks + added_files + removed_files for seq_name in block.sequences})
+
+        update = ParseUpdate(None, error, [], removed, len(texts), len(parsed), parse_time)
+        if error == None:
+            update.flattened = [seq_name for seq_name in sequences if seq_name not in self.bounded]
+            output = io.StringIO()
+            try:
+                with contextlib.redirect_stdout(output):
+                    for seq_name in update.flattened:
+                        self.parser.flatten_seq(seq_name, sequences, runseqs, self.flattened)
+            except Exception:
+                update.error = output.getvalue().rstrip("\n")
+                update.flattened = []
+            else:
+                for seq_name in update.flattened:
+                    self.bounded[seq_name] = self.parser.bound_timing(self.flattened[seq_name])
+                update.sequences = {seq_name: self.bounded[seq_name] for seq_name in sequences}
+        update.flatten_time = time.perf_counter() - start
+        return update
+
+    def count_includes(self, block: Block, count: int):
+        # Includes of sequences defined again later are counted as well, they may only cause extra flattening
+        for seq_name, instrs in block.runseqs.items():
+            for runseq in instrs:
+                includers = self.includers.setdefault(runseq.seq_name, {})
+                includers[seq_name] = includers.get(seq_name, 0) + count
+                if includers[seq_name] == 0:
+                    del includers[seq_name]
+                    if len(includers) == 0:
+                        del self.includers[runseq.seq_name]
+
+    def invalidate(self, changed: set[str]):
+        """Forget the flattened changed sequences and the sequences running them, directly or not."""
+        stack = list(changed)
+        invalidated = set(changed)
+        while len(stack) > 0:
+            for includer in self.includers.get(stack.pop(), ()):
+                if includer not in invalidated:
+                    invalidated.add(includer)
+                    stack += [includer]
+
+        for seq_name in invalidated:
+            self.flattened.pop(seq_name, None)
+            self.bounded.pop(seq_name, None)
@@ -2,10 +2,28 @@ from fprime_test_sequencer.parser.tokens import *
 from fprime_test_sequencer.parser.exceptions import ParseError
 from dataclasses import dataclass, replace
 import abc
+import bisect
+import re
 
 
 INDENTATION_SIZE = 2
 
+INDENTATION_PATTERN = re.compile(f"(?:{' ' * INDENTATION_SIZE})*")
+TOKEN_PATTERN = re.compile(r"""
+     (?P<space>\ +)
+    |(?P<newline>\n)
+    |(?P<comment>\#[^\n]*\n?)
+    |(?P<regex>re"(?:[^"\n]|"")*+")
+    |(?P<string>"(?:[^"\n]|"")*+")
+    |(?P<unterminated>(?:re)?")
+    |(?P<number>(?:[0-9.\-][0-9.]*)?[0-9]\.?[eE][-+]?[0-9]+|[0-9.\-][0-9.]*)
+    |(?P<syntax>[\[:\]])
+    |(?P<identifier>[^\W\d][\w.]*)
+""", re.VERBOSE)
+# Exponent of a number, e.g. in 2.5e-3 or 1.e5, only read after a digit and when followed by a digit
+MANTISSA_END_PATTERN = re.compile(r"[0-9]\.?\Z")
+EXPONENT_PATTERN = re.compile(r"[eE][-+]?[0-9]")
+
 
 class Reader(abc.ABC):
     @abc.abstractmethod
@@ -89,13 +107,99 @@ class FileReader(Reader):
         return self.cursor.col + 1
 
 
+class BufferReader(Reader):
+    """Reader over the whole source held in memory, using integer offsets."""
+
+    def __init__(self, filename, buffer: str | None = None) -> None:
+        super().__init__()
+        self.filename = filename
+        if buffer == None:
+            with open(self.filename, 'r') as f:
+                buffer = f.read()
+        self.buffer = buffer
+        self.pos = 0
+        self.line_starts = [0] + [m.end() for m in re.finditer('\n', buffer) if m.end() < len(buffer)]
+
+    def _line_idx(self) -> int:
+        return bisect.bisect_right(self.line_starts, self.pos) - 1
+
+    def at_line_start(self) -> bool:
+        return self.pos == 0 or self.buffer[self.pos - 1] == '\n'
+
+    def peek(self, k: int = 1) -> str:
+        return self.buffer[self.pos:self.pos + k]
+
+    def read(self, k: int = 1) -> str:
+        chars = self.buffer[self.pos:self.pos + k]
+        self.pos += len(chars)
+        return chars
+
+    def source_name(self) -> str:
+        return self.filename
+
+    def current_line(self) -> str:
+        start = self.line_starts[self._line_idx()]
+        end = self.buffer.find('\n', start)
+        return self.buffer[start:] if end == -1 else self.buffer[start:end + 1]
+
+    def current_line_no(self) -> int:
+        return self._line_idx() + 1
+
+    def current_offset(self) -> int:
+        return self.pos - self.line_starts[self._line_idx()] + 1
+
+
 class Lexer:
     def __init__(self, reader: Reader) -> None:
         self.reader = reader
 
     def next_token(self):
+        if isinstance(self.reader, BufferReader):
+            return self.next_token_fast()
         return self.process_new_line() if self.reader.current_offset() == 1 else self.process_default()
 
+    def next_token_fast(self):
+        """Match whole tokens with TOKEN_PATTERN, falling back to the character-wise methods for errors."""
+        reader = self.reader
+        buffer = reader.buffer
+
+        if reader.at_line_start():
+            level = len(INDENTATION_PATTERN.match(buffer, reader.pos).group()) // INDENTATION_SIZE
+            if level != 0:
+                reader.pos += level * INDENTATION_SIZE
+                return IndentationToken(level)
+
+        while (match_ := TOKEN_PATTERN.match(buffer, reader.pos)) != None:
+            kind = match_.lastgroup
+            text = match_.group()
+            if kind == 'unterminated' or (kind == 'identifier' and not (text[0].isalpha() or text[0] == '_')):
+                break
+            reader.pos = match_.end()
+            match kind:
+                case 'space':
+                    continue
+                case 'newline':
+                    return NewLineToken()
+                case 'comment':
+                    return NewLineToken() if text.endswith('\n') else None
+                case 'regex':
+                    regex = text[3:-1].replace('""', '"')
+                    self.check_regex(regex)
+                    return LitteralToken(regex, is_regex=True)
+                case 'string':
+                    return LitteralToken(text[1:-1].replace('""', '"'), is_regex=False)
+                case 'number':
+                    return LitteralToken(text, is_regex=False)
+                case 'syntax':
+                    return SyntaxToken(text)
+                case 'identifier':
+                    if Keyword.is_keyword(text):
+                        return KeywordToken(Keyword.from_str(text))
+                    return IdentifierToken(text)
+
+        # Let the character-wise lexer reach EOF or raise the appropriate ParseError
+        return self.process_default()
+
     def process_new_line(self):
         indentation_level = 0
         while self.reader.peek(INDENTATION_SIZE) == ' ' * INDENTATION_SIZE:
@@ -150,6 +254,8 @@ class Lexer:
                     if self.reader.peek() == '"':
                         string += self.reader.read()
                     else:
+                        if is_regex:
+                            self.check_regex(string)
                         return LitteralToken(string, is_regex)
                 case '\n':
                     break
@@ -162,6 +268,16 @@ class Lexer:
                          self.reader.current_line(),
                          "Expected closing '\"'")
 
+    def check_regex(self, regex: str):
+        try:
+            re.compile(regex)
+        except re.error as e:
+            raise ParseError(self.reader.source_name(),
+                             self.reader.current_line_no(),
+                             self.reader.current_offset(),
+                             self.reader.current_line(),
+                             f"Invalid regular expression: {e}")
+
     def process_number(self):
         number = self.reader.read()
 
@@ -171,6 +287,11 @@ class Lexer:
             else:
                 break
 
+        if MANTISSA_END_PATTERN.search(number) != None and (exponent := EXPONENT_PATTERN.match(self.reader.peek(3))) != None:
+            number += self.reader.read(len(exponent.group()))
+            while (char := self.reader.peek()) != '' and char in "0123456789":
+                number += self.reader.read()
+
         return LitteralToken(number, is_regex=False)
 
     def process_identifier(self):
@@ -0,0 +1,195 @@
+from fprime_test_sequencer.parser.exceptions import LoadError, ParseError
+from fprime_test_sequencer.parser.lexer import BufferReader, Lexer
+from fprime_test_sequencer.parser.parser import Parser, RunSeqInstruction, Sequence
+from dataclasses import dataclass, field
+import contextlib
+import io
+import os
+
+
+SOURCE_SUFFIX = ".fpseq"
+
+
+@dataclass
+class Block:
+    """Sequences and imports read from a source or part of it, or the error it holds, with line numbers counted from its start."""
+    sequences: dict[str, Sequence] = field(default_factory=dict)
+    runseqs: dict[str, list[RunSeqInstruction]] = field(default_factory=dict)
+    imports: list[str] = field(default_factory=list)
+    error: ParseError | str | None = None
+
+
+def read_block(filename: str, text: str) -> Block:
+    parser = Parser(Lexer(BufferReader(filename, text)))
+    output = io.StringIO()
+    try:
+        # Errors found by the parser are printed, they are kept to be printed when the block is reported
+        with contextlib.redirect_stdout(output):
+            read = parser.read_sequences()
+    except ParseError as pe:
+        return Block(error=pe)
+    if read == None:
+        return Block(error=output.getvalue())
+    return Block(*read, parser.imports)
+
+
+def read_file(filename: str) -> Block:
+    """Read an imported file, with errors as text since parse errors can't be sent back by worker processes."""
+    try:
+        with open(filename, 'r') as f:
+            source = f.read()
+    except OSError as e:
+        return Block(error=f"Couldn't read {filename}: {e}")
+    block = read_block(filename, source)
+    if isinstance(block.error, ParseError):
+        block.error = str(block.error)
+    elif block.error != None:
+        block.error = f"In file {filename}\n{block.error.rstrip()}"
+    return block
+
+
+def stamp(path: str) -> tuple[int, int] | None:
+    try:
+        stat = os.stat(path)
+    except OSError:
+        return None
+    return stat.st_mtime_ns, stat.st_size
+
+
+class Loader:
+    """
+    Reader of the files imported by sources. Imported files are independent until linked, so they are
+    read by a pool of worker processes as soon as their importer is read. Files read are kept along
+    with their mtime and size, and only read again once these changed.
+    """
+
+    def __init__(self, workers: int | None = None) -> None:
+        self.workers = workers if workers != None else os.cpu_count() or 1
+        self.files: dict[str, tuple[tuple[int, int] | None, Block]] = {}
+        # Files and directories named by the imports of the last source loaded, even missing ones,
+        # along with the files read, so that changes to any of them are noticed
+        self.paths: list[str] = []
+
+    def resolve(self, importer: str, imports: list[str], paths: list[str]) -> list[str]:
+        """Return the files imported by importer, directories being replaced by the sources they hold."""
+        directory = os.path.dirname(importer)
+        files = []
+        for path in imports:
+            path = os.path.normpath(os.path.join(directory, path))
+            paths += [path]
+            if os.path.isdir(path):
+                files += sorted(os.path.join(path, name) for name in os.listdir(path) if name.endswith(SOURCE_SUFFIX))
+            elif os.path.isfile(path):
+                files += [path]
+            else:
+                raise LoadError(f"File not found: {path}, imported from {importer}")
+        return files
+
+    def load(self, filename: str, imports: list[str]) -> list[Block]:
+        """
+        Read the files imported by filename, directly or not. Each file is read once, and ordered after
+        the files it imports, in import order.
+        """
+        # Only imported when reading imports, so that the syntax check of a single file starts faster
+        from concurrent.futures import FIRST_COMPLETED, Future, ProcessPoolExecutor, wait
+        import multiprocessing
+
+        filename = os.path.normpath(filename)
+        self.paths = paths = []
+        # Files are identified by their real path, so that a file imported through several paths, e.g. through
+        # ".." or a symbolic link, is read once. The first path it is imported by is kept for messages.
+        root = os.path.realpath(filename)
+        names = {root: filename}
+        queue = self.resolve(filename, imports, paths)
+        imported = {root: [os.path.realpath(name) for name in queue]}
+        blocks: dict[str, Block] = {}
+        running: dict[Future, tuple[str, tuple[int, int] | None]] = {}
+        seen = {root}
+
+        with contextlib.ExitStack() as stack:
+            executor = None
+            while len(queue) > 0 or len(running) > 0:
+                finished = []
+                unread = []
+                for name in queue:
+                    path = os.path.realpath(name)
+                    if path in seen:
+                        continue
+                    seen.add(path)
+                    names[path] = name
+                    path_stamp = stamp(path)
+                    cached_stamp, block = self.files.get(path, (None, None))
+                    if block != None and path_stamp != None and cached_stamp == path_stamp:
+                        finished += [(path, path_stamp, block)]
+                    else:
+                        unread += [(path, path_stamp)]
+                queue = []
+
+                if self.workers == 1 or (len(unread) == 1 and len(running) == 0):
+                    # Nothing to read in parallel, e.g. a single imported file
+                    finished += [(path, path_stamp, read_file(names[path])) for path, path_stamp in unread]
+                else:
+                    for path, path_stamp in unread:
+                        if executor == None:
+                            # Forked workers may inherit locks held by other threads, e.g. of a daemon or a watcher
+                            executor = stack.enter_context(ProcessPoolExecutor(self.workers, mp_context=multiprocessing.get_context("forkserver")))
+                        running[executor.submit(read_file, names[path])] = (path, path_stamp)
+                    if len(finished) == 0:
+                        done, _ = wait(running, return_when=FIRST_COMPLETED)
+                        for future in done:
+                            path, path_stamp = running.pop(future)
+                            finished += [(path, path_stamp, future.result())]
+
+                for path, path_stamp, block in finished:
+                    self.files[path] = (path_stamp, block)
+                    if block.error == None:
+                        try:
+                            files = self.resolve(names[path], block.imports, paths)
+                            imported[path] = [os.path.realpath(name) for name in files]
+                            queue += files
+                        except LoadError as e:
+                            block = Block(error=str(e))
+                    blocks[path] = block
+
+        # Files no longer imported are forgotten
+        self.files = {path: self.files[path] for path in blocks}
+
+        order = []
+        visited = {root}
+        def visit(importer: str):
+            for path in imported.get(importer, []):
+                if path not in visited:
+                    visited.add(path)
+                    visit(path)
+                    order.append(path)
+        visit(root)
+
+        self.paths = list(dict.fromkeys(paths + [names[path] for path in order]))
+        # Errors are reported in import order, whichever file was read first
+        for path in order:
+            if blocks[path].error != None:
+                raise LoadError(blocks[path].error)
+        return [blocks[path] for path in order]
+
+
+def load_sequences(filename: str, source: str, loader: Loader | None = None) -> tuple[dict[str, Sequence] | None, list[str]]:
+    """
+    Parse source, read from filename, and the files it imports into linked sequences. Return them along
+    with the imported files and directories, the sequences being None if the parser printed an error.
+    """
+    parser = Parser(Lexer(BufferReader(filename, source)))
+    read = parser.read_sequences()
+    if read == None:
+        return None, []
+    if len(parser.imports) == 0:
+        return parser.link(*read), []
+
+    loader = loader if loader != None else Loader()
+    blocks = loader.load(filename, parser.imports)
+    # Sequences defined again override the imported ones, as in a single file
+    sequences: dict[str, Sequence] = {}
+    runseqs: dict[str, list[RunSeqInstruction]] = {}
+    for block in blocks + [Block(*read)]:
+        sequences.update(block.sequences)
+        runseqs.update(block.runseqs)
+    return parser.link(sequences, runseqs), loader.paths
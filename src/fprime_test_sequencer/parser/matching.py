@@ -0,0 +1,70 @@
+import re
+
+
+# Expressions with backreferences, conditional group references, named groups or global inline flags can't
+# be embedded in a combined pattern
+UNCOMBINABLE = re.compile(r"\\[1-9]|\(\?\(|\(\?P[<=]|\(\?[aiLmsux]+\)")
+MAX_CACHED_VALUES = 4096
+
+
+class ValueMatcher:
+    """
+    Match received values against the expected values of several expectations at once.
+
+    Exact values are looked up in a dictionary and regular expressions are combined into a
+    single pattern made of one optional lookahead per expression, so that each received value
+    is matched in one pass whatever the number of expectations.
+    """
+
+    def __init__(self, expected: list[tuple[str | None, re.Pattern | None]]) -> None:
+        """Build the matcher from (expected_value, pattern) pairs, pattern being None for exact values."""
+        self.any: set[int] = set()
+        self.exact: dict[str, set[int]] = {}
+        self.separate: list[tuple[re.Pattern, set[int]]] = []
+        self.groups: list[tuple[int, set[int]]] = []
+        self.combined: re.Pattern | None = None
+        self.cache: dict[str, frozenset[int]] = {}
+
+        regexes: dict[str, tuple[re.Pattern, set[int]]] = {}
+        for slot, (value, pattern) in enumerate(expected):
+            if value == None:
+                self.any.add(slot)
+            elif pattern != None:
+                regexes.setdefault(value, (pattern, set()))[1].add(slot)
+            else:
+                self.exact.setdefault(value, set()).add(slot)
+
+        lookaheads = []
+        group = 1
+        for expr, (pattern, slots) in regexes.items():
+            if UNCOMBINABLE.search(expr):
+                self.separate.append((pattern, slots))
+            else:
+                lookaheads.append(f"(?:(?=(?s:.*?)({expr}))|)")
+                self.groups.append((group, slots))
+                group += 1 + pattern.groups
+        if lookaheads:
+            self.combined = re.compile("".join(lookaheads))
+
+    def matching(self, value: str) -> frozenset[int]:
+        """Return the slots of the expected values matching value."""
+        if value in self.cache:
+            return self.cache[value]
+
+        slots = self.any | self.exact.get(value, set())
+        if self.combined != None:
+            match_ = self.combined.match(value)
+            for group, group_slots in self.groups:
+                if match_.start(group) != -1:
+                    slots |= group_slots
+        for pattern, pattern_slots in self.separate:
+            if pattern.search(value) != None:
+                slots |= pattern_slots
+
+        if len(self.cache) >= MAX_CACHED_VALUES:
+            self.cache.clear()
+        self.cache[value] = frozenset(slots)
+        return self.cache[value]
+
+    def __getstate__(self):
+        return self.__dict__ | {"cache": {}}
@@ -1,8 +1,15 @@
 from fprime_test_sequencer.parser.tokens import *
 from fprime_test_sequencer.parser.lexer import Lexer
+from fprime_test_sequencer.parser.matching import ValueMatcher
+from fprime_test_sequencer.parser.predicates import COMPARISONS, NumericPredicate, is_number, parse_number
+from fprime_test_sequencer.parser.views import InstructionView, latest_time
+from fprime_test_sequencer.parser.windows import WindowIndex
 from dataclasses import dataclass, field, replace
+from functools import cache
 from typing import Self
 import abc
+import itertools
+import re
 
 
 class TokenSlot:
@@ -15,13 +22,14 @@ class TokenSlot:
         self.any_nb = any_nb
 
     def match(self, token) -> bool:
-        if not self.filter(token):
+        # Check the token type before filtering, as filters expect tokens of the expected type
+        if isinstance(self.expected_token, type):
+            if not isinstance(token, self.expected_token):
+                return False
+        elif token != self.expected_token:
             return False
 
-        if isinstance(self.expected_token, type):
-            return isinstance(token, self.expected_token)
-        else:
-            return token == self.expected_token
+        return bool(self.filter(token))
 
 
 class Instruction(abc.ABC):
@@ -36,9 +44,14 @@ class Instruction(abc.ABC):
     def from_token_dict(cls, token_dict: dict) -> Self:
         """Construct the instruction from the token dictionnary returned by Instruction.parse."""
 
+    @classmethod
+    @cache
+    def cached_structure(cls) -> list[tuple[str | None, TokenSlot]]:
+        return cls.get_structure()
+
     @classmethod
     def parse(cls, tokens: list) -> dict | None:
-        slots = cls.get_structure()
+        slots = cls.cached_structure()
         instruction_dict = {}
         token_idx = 0
         slot_idx = 0
@@ -146,6 +159,13 @@ class ExpectEventInstruction(Instruction):
     expected_value: str | None = None
     is_regex: bool = False
     is_expected: bool = True
+    pattern: re.Pattern | None = field(default=None, repr=False, compare=False)
+    value_matcher: ValueMatcher | None = field(default=None, repr=False, compare=False)
+    matcher_slot: int = field(default=0, repr=False, compare=False)
+
+    def __post_init__(self):
+        if self.is_regex and self.pattern == None:
+            self.pattern = re.compile(self.expected_value)
 
     @classmethod
     def get_structure(cls) -> list[tuple[str | None, TokenSlot]]:
@@ -179,6 +199,15 @@ class ExpectEventInstruction(Instruction):
         copy.end_time_ms += time_offset if self.end_time_ms != -1 else 0
         return copy
 
+    def matches_value(self, value: str) -> bool:
+        if self.value_matcher != None:
+            return self.matcher_slot in self.value_matcher.matching(value)
+        if self.expected_value == None:
+            return True
+        if self.is_regex:
+            return self.pattern.search(value) != None
+        return self.expected_value == value
+
     def __str__(self) -> str:
         timing = f"[{self.start_time_ms}:{self.end_time_ms}]"
         event = f"EXPECT{'' if self.is_expected else ' NO'} EVENT {self.event}"
@@ -194,6 +223,16 @@ class ExpectTelemetryInstruction(Instruction):
     expected_value: str | None = None
     is_regex: bool = False
     is_expected: bool = True
+    predicate: NumericPredicate | None = None
+    # Whether all samples received within the window must match, rather than any of them
+    is_universal: bool = False
+    pattern: re.Pattern | None = field(default=None, repr=False, compare=False)
+    value_matcher: ValueMatcher | None = field(default=None, repr=False, compare=False)
+    matcher_slot: int = field(default=0, repr=False, compare=False)
+
+    def __post_init__(self):
+        if self.is_regex and self.pattern == None:
+            self.pattern = re.compile(self.expected_value)
 
     @classmethod
     def get_structure(cls) -> list[tuple[str | None, TokenSlot]]:
@@ -205,20 +244,55 @@ class ExpectTelemetryInstruction(Instruction):
             (None, TokenSlot(SyntaxToken(']'))),
             (None, TokenSlot(KeywordToken(Keyword.EXPECT))),
             ("is_not_expected", TokenSlot(KeywordToken(Keyword.NO), optional=True)),
+            ("is_universal", TokenSlot(KeywordToken(Keyword.ALL), optional=True)),
             (None, TokenSlot(KeywordToken(Keyword.TELEMETRY))),
             ("channel", TokenSlot(IdentifierToken)),
-            ("expected_value", TokenSlot(LitteralToken, optional=True))
+            ("expected_value", TokenSlot(LitteralToken, optional=True)),
+        ] + [
+            (comparison.name, TokenSlot(KeywordToken(comparison), optional=True)) for comparison in COMPARISONS
+        ] + [
+            ("operands", TokenSlot(LitteralToken, filter=lambda x: not x.is_regex and is_number(x.value), any_nb=True))
         ]
 
+    @classmethod
+    def parse(cls, tokens: list) -> dict | None:
+        token_dict = super().parse(tokens)
+        if token_dict == None:
+            return None
+        comparisons = [comparison for comparison in COMPARISONS if token_dict[comparison.name] != None]
+        value = token_dict["expected_value"]
+        if token_dict["is_not_expected"] != None and token_dict["is_universal"] != None:
+            return None
+        if len(comparisons) == 0:
+            # Expecting all samples to match requires something to match
+            valid = len(token_dict["operands"]) == 0 and (value != None or token_dict["is_universal"] == None)
+        elif comparisons == [Keyword.WITHIN]:
+            valid = value != None and not value.is_regex and is_number(value.value) and len(token_dict["operands"]) == 1
+        else:
+            valid = len(comparisons) == 1 and value == None and len(token_dict["operands"]) == (2 if comparisons[0] == Keyword.BETWEEN else 1)
+        return token_dict if valid else None
+
     @classmethod
     def from_token_dict(cls, token_dict: dict) -> Self:
+        comparisons = [comparison for comparison in COMPARISONS if token_dict[comparison.name] != None]
+        value = token_dict["expected_value"]
+        predicate = None
+        if len(comparisons) > 0:
+            operands = [token.value for token in token_dict["operands"]]
+            if comparisons[0] == Keyword.WITHIN:
+                # The expected value is the center of the tolerance
+                operands = [value.value] + operands
+                value = None
+            predicate = NumericPredicate(comparisons[0], operands)
         return cls(
             channel = token_dict["channel"].name,
             start_time_ms = int(token_dict["start_time_ms"].value) if token_dict["start_time_ms"] != None else 0,
             end_time_ms = int(token_dict["end_time_ms"].value) if token_dict["end_time_ms"] != None else -1,
-            expected_value = token_dict["expected_value"].value if token_dict["expected_value"] != None else None,
-            is_regex = token_dict["expected_value"].is_regex if token_dict["expected_value"] != None else False,
+            expected_value = value.value if value != None else None,
+            is_regex = value.is_regex if value != None else False,
             is_expected = token_dict["is_not_expected"] == None,
+            predicate = predicate,
+            is_universal = token_dict["is_universal"] != None,
         )
 
     def with_time_offset(self, time_offset: int) -> Self:
@@ -227,11 +301,23 @@ class ExpectTelemetryInstruction(Instruction):
         copy.end_time_ms += time_offset if self.end_time_ms != -1 else 0
         return copy
 
+    def matches_value(self, value: str) -> bool:
+        if self.predicate != None:
+            return self.predicate.matches(parse_number(value))
+        if self.value_matcher != None:
+            return self.matcher_slot in self.value_matcher.matching(value)
+        if self.expected_value == None:
+            return True
+        if self.is_regex:
+            return self.pattern.search(value) != None
+        return self.expected_value == value
+
     def __str__(self) -> str:
         timing = f"[{self.start_time_ms}:{self.end_time_ms}]"
-        telemetry = f"EXPECT{'' if self.is_expected else ' NO'} TELEMETRY {self.channel}"
+        telemetry = f"EXPECT{'' if self.is_expected else ' NO'}{' ALL' if self.is_universal else ''} TELEMETRY {self.channel}"
         value = "" if self.expected_value == None else f" {'re' if self.is_regex else ''}\"{self.expected_value}\""
-        return f"{timing} {telemetry}{value}"
+        predicate = "" if self.predicate == None else f" {self.predicate}"
+        return f"{timing} {telemetry}{value}{predicate}"
 
 
 @dataclass
@@ -287,13 +373,32 @@ class RunSeqInstruction(Instruction):
     def from_token_dict(cls, token_dict: dict) -> Self:
         return cls(
             seq_name = token_dict["seq_name"].name,
-            start_time_ms = int(token_dict["start_time_ms"].value)
+            start_time_ms = int(token_dict["start_time_ms"].value) if token_dict["start_time_ms"] != None else 0
         )
 
     def __str__(self) -> str:
         return f"[{self.start_time_ms}] RUNSEQ {self.seq_name}"
 
 
+@dataclass
+class ImportInstruction(Instruction):
+    path: str
+
+    @classmethod
+    def get_structure(cls) -> list[tuple[str | None, TokenSlot]]:
+        return [
+            (None, TokenSlot(KeywordToken(Keyword.IMPORT))),
+            ("path", TokenSlot(LitteralToken, filter=lambda x: not x.is_regex))
+        ]
+
+    @classmethod
+    def from_token_dict(cls, token_dict: dict) -> Self:
+        return cls(path = token_dict["path"].value)
+
+    def __str__(self) -> str:
+        return f'IMPORT "{self.path}"'
+
+
 @dataclass
 class EmptyInstruction(Instruction):
 
@@ -310,10 +415,16 @@ class EmptyInstruction(Instruction):
 class Sequence:
     name: str
     is_test: bool
-    command_instrs: list[CommandInstruction] = field(default_factory=list)
-    event_instrs: list[ExpectEventInstruction] = field(default_factory=list)
-    telemetry_instrs: list[ExpectTelemetryInstruction] = field(default_factory=list)
-    uplink_instrs: list[UplinkInstruction] = field(default_factory=list)
+    command_instrs: list[CommandInstruction] | InstructionView = field(default_factory=list)
+    event_instrs: list[ExpectEventInstruction] | InstructionView = field(default_factory=list)
+    telemetry_instrs: list[ExpectTelemetryInstruction] | InstructionView = field(default_factory=list)
+    uplink_instrs: list[UplinkInstruction] | InstructionView = field(default_factory=list)
+    event_windows: WindowIndex | None = field(default=None, repr=False, compare=False)
+    telemetry_windows: WindowIndex | None = field(default=None, repr=False, compare=False)
+
+    def index_windows(self):
+        self.event_windows = WindowIndex(self.event_instrs, lambda ei: ei.event)
+        self.telemetry_windows = WindowIndex(self.telemetry_instrs, lambda ti: ti.channel)
 
     def get_ordered_commands(self):
         return sorted(self.command_instrs, key=lambda ci: ci.send_time_ms)
@@ -323,25 +434,50 @@ class Sequence:
 
     def get_duration(self):
         return max(
-            0 if len(self.command_instrs) == 0 else max(self.command_instrs, key=lambda ci: ci.send_time_ms).send_time_ms,
-            0 if len(self.event_instrs) == 0 else max(self.event_instrs, key=lambda ei: int(ei.end_time_ms)).end_time_ms,
-            0 if len(self.telemetry_instrs) == 0 else max(self.telemetry_instrs, key=lambda ti: ti.end_time_ms).end_time_ms,
-            0 if len(self.uplink_instrs) == 0 else max(self.uplink_instrs, key=lambda ui: ui.uplink_time_ms).uplink_time_ms
+            0,
+            latest_time(self.command_instrs, "send_time_ms"),
+            latest_time(self.event_instrs, "end_time_ms"),
+            latest_time(self.telemetry_instrs, "end_time_ms"),
+            latest_time(self.uplink_instrs, "uplink_time_ms")
         )
 
-    def merge(self, sequence: Self, time_offset: int=0):
-        self.command_instrs += list(map(lambda ci: ci.with_time_offset(time_offset), sequence.command_instrs))
-        self.event_instrs += list(map(lambda ei: ei.with_time_offset(time_offset), sequence.event_instrs))
-        self.telemetry_instrs += list(map(lambda ti: ti.with_time_offset(time_offset), sequence.telemetry_instrs))
-        self.uplink_instrs += list(map(lambda ui: ui.with_time_offset(time_offset), sequence.uplink_instrs))
-
 
 class Parser:
     def __init__(self, lexer: Lexer) -> None:
         self.lexer = lexer
+        # Paths imported by the source, as written, filled by read_sequences
+        self.imports: list[str] = []
+
+    @staticmethod
+    @cache
+    def dispatch_table() -> tuple[dict[tuple[Keyword, ...], list[type[Instruction]]], set[Keyword]]:
+        """
+        Map the sequence of keywords of each instruction structure to the instruction types, along
+        with the set of keywords which are never required by any structure and thus left out of keys.
+        """
+        keyword_slots = {
+            instruction_type: [slot for _, slot in instruction_type.cached_structure() if isinstance(slot.expected_token, KeywordToken)]
+            for instruction_type in Instruction.__subclasses__()
+        }
+        all_keywords = {slot.expected_token.word for slots in keyword_slots.values() for slot in slots}
+        required = {slot.expected_token.word for slots in keyword_slots.values() for slot in slots if not slot.optional}
+        ignored = all_keywords - required
+
+        table: dict[tuple[Keyword, ...], list[type[Instruction]]] = {}
+        for instruction_type, slots in keyword_slots.items():
+            alternatives = []
+            for slot in slots:
+                word = slot.expected_token.word
+                if word not in ignored:
+                    alternatives += [[(), (word,)] if slot.optional else [(word,)]]
+            for keywords in itertools.product(*alternatives):
+                table.setdefault(sum(keywords, ()), []).append(instruction_type)
+        return table, ignored
 
     def match_instruction(self, tokens: list):
-        for instruction_type in Instruction.__subclasses__():
+        table, ignored = self.dispatch_table()
+        keywords = tuple(token.word for token in tokens if isinstance(token, KeywordToken) and token.word not in ignored)
+        for instruction_type in table.get(keywords, []):
             if (token_dict := instruction_type.parse(tokens)) != None:
                 return instruction_type.from_token_dict(token_dict)
         return None
@@ -364,31 +500,43 @@ class Parser:
                     seq_name: str,
                     named_sequences: dict[str, Sequence],
                     named_runsec_instrs: dict[str, list[RunSeqInstruction]],
+                    flattened_sequences: dict[str, Sequence],
                     seq_name_stack: list[str]=[]) -> Sequence:
+        if seq_name in flattened_sequences:
+            return flattened_sequences[seq_name]
         if seq_name in seq_name_stack:
             print("==== ERROR 5 ====")
             raise Exception()
         if not seq_name in named_sequences:
             print("==== ERROR 6 ====")
             raise Exception()
-        sequence = replace(named_sequences[seq_name])
-        for runseq in named_runsec_instrs[seq_name]:
-            flattened_subseq = self.flatten_seq(runseq.seq_name, named_sequences, named_runsec_instrs, seq_name_stack + [seq_name])
-            sequence.merge(flattened_subseq, runseq.start_time_ms)
-        return sequence
+        sequence = named_sequences[seq_name]
+        subsequences = [
+            (runseq.start_time_ms, self.flatten_seq(runseq.seq_name, named_sequences, named_runsec_instrs, flattened_sequences, seq_name_stack + [seq_name]))
+            for runseq in named_runsec_instrs[seq_name]
+        ]
+        # Unbounded ends of included expectations are set to the end of their own block, not of the including sequence
+        bounded = [(offset, self.bound_timing(subseq)) for offset, subseq in subsequences]
+        flattened_sequences[seq_name] = Sequence(
+            sequence.name,
+            sequence.is_test,
+            InstructionView(sequence.command_instrs, [(offset, subseq.command_instrs) for offset, subseq in subsequences]),
+            InstructionView(sequence.event_instrs, [(offset, subseq.event_instrs) for offset, subseq in bounded]),
+            InstructionView(sequence.telemetry_instrs, [(offset, subseq.telemetry_instrs) for offset, subseq in bounded]),
+            InstructionView(sequence.uplink_instrs, [(offset, subseq.uplink_instrs) for offset, subseq in subsequences])
+        )
+        return flattened_sequences[seq_name]
 
     def bound_timing(self, sequence: Sequence):
-        seq = replace(sequence)
-        seq_duration = seq.get_duration()
-        for event in seq.event_instrs:
-            if event.end_time_ms == -1:
-                event.end_time_ms = seq_duration
-        for tel in seq.telemetry_instrs:
-            if tel.end_time_ms == -1:
-                tel.end_time_ms = seq_duration
-        return seq
+        seq_duration = sequence.get_duration()
+        return replace(
+            sequence,
+            event_instrs=sequence.event_instrs.bounded(seq_duration),
+            telemetry_instrs=sequence.telemetry_instrs.bounded(seq_duration)
+        )
 
-    def parse(self) -> dict[str, Sequence] | None:
+    def read_sequences(self) -> tuple[dict[str, Sequence], dict[str, list[RunSeqInstruction]]] | None:
+        """Read the sequences of the file as written, along with their RUNSEQ instructions, by sequence name."""
         sequences: dict[str, Sequence] = {}
         runseqs: dict[str, list[RunSeqInstruction]] = {}
         current_sequence: Sequence | None = None
@@ -406,6 +554,12 @@ class Parser:
                     runseqs[seq_name] = []
                     timing_stack = [0]
 
+                case ImportInstruction(path):
+                    if indentation != 0:
+                        print("==== ERROR 1 ====")
+                        return None
+                    self.imports += [path]
+
                 case EmptyInstruction():
                     pass
 
@@ -448,9 +602,21 @@ class Parser:
         if current_sequence != None:
             sequences[current_sequence.name] = current_sequence
 
+        return sequences, runseqs
+
+    def link(self, sequences: dict[str, Sequence], runseqs: dict[str, list[RunSeqInstruction]]) -> dict[str, Sequence]:
+        """Flatten and bound the sequences read, possibly from several sources."""
+        # Flattened sequences are memoized, their unbounded expectation ends being kept until the
+        # sequence is bounded by the duration of the sequence actually run
         flattened_sequences: dict[str, Sequence] = {}
         for seq_name in sequences.keys():
-            flattened_sequences[seq_name] = self.bound_timing(self.flatten_seq(seq_name, sequences, runseqs))
-            
-        return flattened_sequences
+            self.flatten_seq(seq_name, sequences, runseqs, flattened_sequences)
+
+        return {seq_name: self.bound_timing(flattened_sequences[seq_name]) for seq_name in sequences.keys()}
+
+    def parse(self) -> dict[str, Sequence] | None:
+        read = self.read_sequences()
+        if read == None:
+            return None
+        return self.link(*read)
 
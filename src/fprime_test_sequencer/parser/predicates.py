@@ -0,0 +1,105 @@
+from fprime_test_sequencer.parser.tokens import Keyword
+from dataclasses import dataclass, field
+import math
+import re
+
+try:
+    import numpy
+except ImportError:
+    numpy = None
+
+
+# Values are displayed with the format string of their channel, e.g. "3.30 V"
+NUMBER_PATTERN = re.compile(r"[-+]?(?:\d+\.?\d*|\.\d+)(?:[eE][-+]?\d+)?")
+COMPARISONS = (Keyword.BETWEEN, Keyword.ABOVE, Keyword.BELOW, Keyword.WITHIN)
+# Windows with fewer samples are scanned one sample at a time, slicing arrays costing more than it saves
+MIN_VECTORIZED_SAMPLES = 64
+
+
+def is_number(text: str) -> bool:
+    try:
+        float(text)
+        return True
+    except ValueError:
+        return False
+
+
+def parse_number(text: str) -> float:
+    """Return the first number of a displayed value, NaN if there is none so that no comparison holds."""
+    match_ = NUMBER_PATTERN.search(text)
+    return float(match_.group()) if match_ != None else math.nan
+
+
+def numeric_column(values: list[float]):
+    """Return values as a column scanned by NumericPredicate.scan, an array if NumPy is available."""
+    return numpy.array(values, dtype=float) if numpy != None else values
+
+
+@dataclass
+class NumericPredicate:
+    """
+    Comparison of the numeric value of telemetry samples, one of:
+
+        BETWEEN <lower> <upper>    lower <= value <= upper
+        ABOVE <threshold>          value > threshold
+        BELOW <threshold>          value < threshold
+        <center> WITHIN <margin>   |value - center| <= margin
+    """
+    comparison: Keyword
+    # Operands as written, in the order they are written
+    operands: list[str]
+    numbers: list[float] = field(init=False, repr=False, compare=False)
+
+    def __post_init__(self):
+        self.numbers = [float(operand) for operand in self.operands]
+
+    def matches(self, value: float) -> bool:
+        match self.comparison:
+            case Keyword.BETWEEN:
+                return self.numbers[0] <= value <= self.numbers[1]
+            case Keyword.ABOVE:
+                return value > self.numbers[0]
+            case Keyword.BELOW:
+                return value < self.numbers[0]
+            case Keyword.WITHIN:
+                return abs(value - self.numbers[0]) <= self.numbers[1]
+        return False
+
+    def matches_array(self, values):
+        """Vectorized matches over an array of values, NaN never matching."""
+        match self.comparison:
+            case Keyword.BETWEEN:
+                return (values >= self.numbers[0]) & (values <= self.numbers[1])
+            case Keyword.ABOVE:
+                return values > self.numbers[0]
+            case Keyword.BELOW:
+                return values < self.numbers[0]
+            case Keyword.WITHIN:
+                return numpy.abs(values - self.numbers[0]) <= self.numbers[1]
+
+    def scan(self, values, start: int, end: int, universal: bool = False) -> tuple[int | None, int | None]:
+        """
+        Return the indices of the first of values[start:end] matching and, if all of them are expected to
+        match, of the first one not matching, None if there is none. Large windows of arrays are
+        scanned in a single vectorized pass, others only until the outcome is known.
+        """
+        if numpy != None and isinstance(values, numpy.ndarray) and end - start >= MIN_VECTORIZED_SAMPLES:
+            matched = self.matches_array(values[start:end])
+            first_match = start + int(matched.argmax()) if matched.any() else None
+            first_mismatch = start + int(matched.argmin()) if universal and not matched.all() else None
+            return first_match, first_mismatch
+
+        first_match = None
+        for idx in range(start, end):
+            if self.matches(values[idx]):
+                first_match = idx if first_match == None else first_match
+                if not universal:
+                    break
+            elif universal:
+                return first_match, idx
+        return first_match, None
+
+    def __str__(self) -> str:
+        if self.comparison == Keyword.WITHIN:
+            return f"{self.operands[0]} WITHIN {self.operands[1]}"
+        return f"{self.comparison.name} {' '.join(self.operands)}"
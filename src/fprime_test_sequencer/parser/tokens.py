@@ -13,6 +13,12 @@ class Keyword(Enum):
     TELEMETRY = auto()
     UPLINK = auto()
     RUNSEQ = auto()
+    ALL = auto()
+    BETWEEN = auto()
+    ABOVE = auto()
+    BELOW = auto()
+    WITHIN = auto()
+    IMPORT = auto()
 
     @classmethod
     def is_keyword(cls, word: str) -> bool:
@@ -0,0 +1,76 @@
+from collections.abc import Iterable, Sequence
+from typing import Self
+
+
+class InstructionView(Sequence):
+    """
+    Read-only, lazily materialized list of the instructions of a flattened sequence.
+
+    A view is made of the sequence's own instructions followed by the views of the included
+    subsequences, each shifted by its start time. Views of a subsequence are shared between all
+    the sequences including it, and instructions are only copied (once, with their absolute
+    timing) when the view is iterated or indexed.
+    """
+
+    def __init__(self, instrs: list, includes: list[tuple[int, Self]] | None = None, end_bound: int | None = None) -> None:
+        """
+        Build a view of instrs followed by the (time_offset, view) includes, unbounded ends of instrs being set to
+        end_bound. Included views keep their own bound, the duration of their block.
+        """
+        self.instrs = instrs
+        self.includes = includes if includes != None else []
+        self.end_bound = end_bound
+        self.length = len(self.instrs) + sum(len(view) for _, view in self.includes)
+        self.latest_times: dict[str, int] = {}
+        self.materialized: list | None = None
+
+    def bounded(self, end_bound: int) -> Self:
+        """Return a view of the same instructions, with unbounded ends of its own instructions set to end_bound."""
+        return InstructionView(self.instrs, self.includes, end_bound)
+
+    def leaves(self, time_offset: int = 0) -> Iterable[tuple[int, object, int | None]]:
+        """Yield the instructions in order, along with their time offset and the end of their block in the viewing sequence."""
+        end_bound = time_offset + self.end_bound if self.end_bound != None else None
+        for instr in self.instrs:
+            yield time_offset, instr, end_bound
+        for include_offset, view in self.includes:
+            yield from view.leaves(time_offset + include_offset)
+
+    def latest(self, attr: str) -> int:
+        """Return the latest value of the given timing attribute, unbounded (-1) ends being ignored."""
+        if attr not in self.latest_times:
+            latest = max((getattr(instr, attr) for instr in self.instrs), default=-1)
+            for time_offset, view in self.includes:
+                if (view_latest := view.latest(attr)) != -1:
+                    latest = max(latest, time_offset + view_latest)
+            self.latest_times[attr] = latest
+        return self.latest_times[attr]
+
+    def materialize(self) -> list:
+        if self.materialized == None:
+            self.materialized = []
+            for time_offset, instr, end_bound in self.leaves():
+                copy = instr.with_time_offset(time_offset)
+                if end_bound != None and copy.end_time_ms == -1:
+                    copy.end_time_ms = end_bound
+                self.materialized.append(copy)
+        return self.materialized
+
+    def __len__(self) -> int:
+        return self.length
+
+    def __getitem__(self, idx):
+        return self.materialize()[idx]
+
+    def __iter__(self):
+        return iter(self.materialize())
+
+    def __getstate__(self):
+        return self.__dict__ | {"materialized": None}
+
+
+def latest_time(instrs: Iterable, attr: str) -> int:
+    """Return the latest value of the given timing attribute of instrs, -1 if there is none."""
+    if isinstance(instrs, InstructionView):
+        return instrs.latest(attr)
+    return max((getattr(instr, attr) for instr in instrs), default=-1)
@@ -0,0 +1,76 @@
+from typing import Callable, Iterable
+
+from fprime_test_sequencer.parser.matching import ValueMatcher
+
+
+class IntervalTree:
+    """Static centered interval tree answering stabbing queries in O(log n + k)."""
+
+    def __init__(self, intervals: list[tuple[int, int, int]]) -> None:
+        """Build the tree from (start, end, value) tuples, bounds included."""
+        # Empty intervals contain no point, and would be pushed down the same side forever
+        intervals = [i for i in intervals if i[0] <= i[1]]
+        endpoints = sorted(bound for start, end, _ in intervals for bound in (start, end))
+        self.center = endpoints[len(endpoints) // 2] if endpoints else 0
+
+        overlapping = [i for i in intervals if i[0] <= self.center <= i[1]]
+        self.by_start = sorted(overlapping, key=lambda i: i[0])
+        self.by_end = sorted(overlapping, key=lambda i: i[1], reverse=True)
+
+        left = [i for i in intervals if i[1] < self.center]
+        right = [i for i in intervals if i[0] > self.center]
+        self.left = IntervalTree(left) if left else None
+        self.right = IntervalTree(right) if right else None
+
+    def at(self, point: float) -> list[int]:
+        """Return the values of all intervals containing point."""
+        values = []
+        node = self
+        while node != None:
+            if point < node.center:
+                for start, _, value in node.by_start:
+                    if start > point:
+                        break
+                    values.append(value)
+                node = node.left
+            elif point > node.center:
+                for _, end, value in node.by_end:
+                    if end < point:
+                        break
+                    values.append(value)
+                node = node.right
+            else:
+                values += [value for _, _, value in node.by_start]
+                break
+        return values
+
+
+class WindowIndex:
+    """
+    Expectation windows of a sequence, grouped by event/channel name or severity.
+
+    Expectations of a same group also share a ValueMatcher, through which their values are matched.
+    """
+
+    def __init__(self, instrs: Iterable, key: Callable) -> None:
+        groups: dict[str, list[tuple[int, int, int]]] = {}
+        grouped_instrs: dict[str, list] = {}
+        for idx, instr in enumerate(instrs):
+            groups.setdefault(key(instr), []).append((instr.start_time_ms, instr.end_time_ms, idx))
+            grouped_instrs.setdefault(key(instr), []).append(instr)
+        self.trees = {name: IntervalTree(intervals) for name, intervals in groups.items()}
+
+        for group in grouped_instrs.values():
+            matcher = ValueMatcher([(instr.expected_value, instr.pattern) for instr in group])
+            for slot, instr in enumerate(group):
+                instr.value_matcher = matcher
+                instr.matcher_slot = slot
+
+    def keys(self) -> set[str]:
+        return set(self.trees.keys())
+
+    def at(self, key: str, time_ms: float) -> list[int]:
+        """Return the indices of the expectations on key whose window contains time_ms."""
+        if key not in self.trees:
+            return []
+        return self.trees[key].at(time_ms)
@@ -0,0 +1,172 @@
+import cProfile
+import io
+import json
+import pstats
+import sys
+import threading
+import time
+import tracemalloc
+from contextlib import contextmanager
+from dataclasses import dataclass, field
+from typing import Callable
+
+from fprime_test_sequencer.cache import tool_version
+from fprime_test_sequencer.parser.parser import ExpectEventInstruction, ExpectTelemetryInstruction, Sequence
+
+
+# Number of functions and allocation sites listed in reports
+TOP_ENTRIES = 25
+
+
+@dataclass
+class ExpectationCost:
+    """Number of received items checked against an expectation, and time spent checking them."""
+    instr: ExpectEventInstruction | ExpectTelemetryInstruction
+    checks: int = 0
+    seconds: float = 0.0
+
+    def check(self, value: str) -> bool:
+        start = time.perf_counter()
+        matched = self.instr.matches_value(value)
+        self.seconds += time.perf_counter() - start
+        self.checks += 1
+        return matched
+
+
+@dataclass
+class SequenceProfile:
+    """Phases and validation cost of a single run of a sequence."""
+    name: str
+    event_costs: list[ExpectationCost]
+    telemetry_costs: list[ExpectationCost]
+    phases: dict[str, float] = field(default_factory=dict)
+    # Items received while the sequence ran, and time spent validating them
+    items: int = 0
+    validation_seconds: float = 0.0
+    history: dict[str, int] = field(default_factory=dict)
+    success: bool | None = None
+
+
+class Profiler:
+    """
+    Records the time spent in each phase of a run, in total and per sequence, along with the cost of
+    validating each expectation, to be written as a JSON report.
+
+    Optionally, hot paths are profiled with cProfile, one profile per thread merged in the report,
+    and allocations are traced with tracemalloc.
+    """
+
+    def __init__(self, enabled: bool = True, cpu: bool = False, memory: bool = False) -> None:
+        self.enabled = enabled
+        self.lock = threading.Lock()
+        self.phases: dict[str, dict[str, float]] = {}
+        self.sequences: list[SequenceProfile] = []
+        self.cpu = cpu
+        self.cpu_profiles: dict[int, cProfile.Profile] = {}
+        self.memory = memory
+        if memory:
+            tracemalloc.start()
+
+    def add(self, name: str, seconds: float, sequence: SequenceProfile | None = None):
+        with self.lock:
+            phase = self.phases.setdefault(name, {"seconds": 0.0, "count": 0})
+            phase["seconds"] += seconds
+            phase["count"] += 1
+            if sequence != None:
+                sequence.phases[name] = sequence.phases.get(name, 0.0) + seconds
+
+    @contextmanager
+    def phase(self, name: str, sequence: SequenceProfile | None = None):
+        if not self.enabled:
+            yield
+            return
+        start = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.add(name, time.perf_counter() - start, sequence)
+
+    def sequence(self, seq: Sequence) -> SequenceProfile | None:
+        """Return the profile of a new run of seq, None if disabled."""
+        if not self.enabled:
+            return None
+        profile = SequenceProfile(seq.name, [ExpectationCost(ei) for ei in seq.event_instrs], [ExpectationCost(ti) for ti in seq.telemetry_instrs])
+        with self.lock:
+            self.sequences.append(profile)
+        return profile
+
+    def hot(self, function: Callable) -> Callable:
+        """Return function, profiled with cProfile when called if enabled."""
+        if not self.cpu:
+            return function
+
+        def profiled(*args, **kwargs):
+            ident = threading.get_ident()
+            with self.lock:
+                profile = self.cpu_profiles.setdefault(ident, cProfile.Profile())
+            return profile.runcall(function, *args, **kwargs)
+
+        return profiled
+
+    def cpu_report(self, filename: str) -> list[dict]:
+        """Dump the merged cProfile statistics to filename and return the top functions by cumulative time."""
+        with self.lock:
+            profiles = list(self.cpu_profiles.values())
+        if len(profiles) == 0:
+            return []
+        stats = pstats.Stats(profiles[0], stream=io.StringIO())
+        for profile in profiles[1:]:
+            stats.add(profile)
+        stats.dump_stats(filename)
+        entries = sorted(stats.stats.items(), key=lambda e: e[1][3], reverse=True)[:TOP_ENTRIES]
+        return [
+            {"function": f"{file}:{line}({function})", "calls": calls, "total_seconds": total, "cumulative_seconds": cumulative}
+            for (file, line, function), (_, calls, total, cumulative, _) in entries
+        ]
+
+    def memory_report(self) -> dict:
+        current, peak = tracemalloc.get_traced_memory()
+        top = tracemalloc.take_snapshot().statistics("lineno")[:TOP_ENTRIES]
+        return {
+            "current_bytes": current,
+            "peak_bytes": peak,
+            "top_allocations": [{"location": str(stat.traceback), "bytes": stat.size, "count": stat.count} for stat in top],
+        }
+
+    def report(self, cpu_filename: str | None = None) -> dict:
+        with self.lock:
+            report = {
+                "version": tool_version(),
+                "command": sys.argv,
+                "phases": {name: dict(phase) for name, phase in self.phases.items()},
+                "sequences": [
+                    {
+                        "name": profile.name,
+                        "success": profile.success,
+                        "phases": dict(profile.phases),
+                        "items_validated": profile.items,
+                        "checks": sum(cost.checks for cost in profile.event_costs + profile.telemetry_costs),
+                        "validation_seconds": profile.validation_seconds,
+                        "history": dict(profile.history),
+                        "expectations": [
+                            {"instruction": str(cost.instr), "checks": cost.checks, "seconds": cost.seconds}
+                            for cost in profile.event_costs + profile.telemetry_costs
+                        ],
+                    }
+                    for profile in self.sequences
+                ],
+            }
+        if self.cpu and cpu_filename != None:
+            report["cpu"] = self.cpu_report(cpu_filename)
+        if self.memory:
+            report["memory"] = self.memory_report()
+        return report
+
+    def write(self, filename: str):
+        """Write the JSON report to filename, and the cProfile statistics next to it if enabled."""
+        report = self.report(f"{filename}.prof")
+        with open(filename, "w") as f:
+            json.dump(report, f, indent=2)
+
+
+NO_PROFILER = Profiler(enabled=False)
@@ -0,0 +1,109 @@
+import re
+from dataclasses import dataclass
+from typing import TextIO
+
+from fprime_test_sequencer.history import HistoryIndex
+from fprime_test_sequencer.parser.parser import Sequence
+from fprime_test_sequencer.util import make_green, make_red
+from fprime_test_sequencer.validator import print_report, validate_history
+
+
+# Entries written by LogWriter: time, optional endpoint tag, kind and text
+LOG_ENTRY = re.compile(r"\[(-?\d+) ms\] (?:\[([^\]]*)\] )?(TEST|COMMAND|UPLINK|EVENT|TELEMETRY) ?(.*)")
+# Logged times are rounded to the millisecond, so items logged on a window bound are taken as inside it
+ROUNDING_MARGIN_S = 0.0005
+
+
+@dataclass
+class LoggedItem:
+    """Event or telemetry entry of a log, standing in for the received item when validating."""
+    time: float
+    # Entry as logged, without its time and kind
+    text: str
+    display_text: str
+
+    def get_display_text(self) -> str:
+        return self.display_text
+
+
+def logged_item_to_str(item: LoggedItem, starting_time: float) -> str:
+    return f"[{round(1000 * (item.time - starting_time))} ms] {item.text}"
+
+
+def unquote(value: str) -> str:
+    """Return the display text of a logged value, empty if there is none."""
+    return value[1:-1] if len(value) >= 2 and value.startswith('"') and value.endswith('"') else ""
+
+
+class Recording:
+    """
+    Events and telemetry of a log written with --log-all, indexed once by endpoint and by key, along
+    with the starting times of the tests run during the recorded session.
+
+    The log is streamed, and only the items whose keys are in the given interest sets are kept.
+    """
+
+    def __init__(self, event_interest: set[str] | None = None, channel_interest: set[str] | None = None) -> None:
+        self.event_interest = event_interest
+        self.channel_interest = channel_interest
+        # Event and telemetry indexes by endpoint tag, empty when the log isn't tagged
+        self.indexes: dict[str, tuple[HistoryIndex, HistoryIndex]] = {}
+        # Endpoint tags and starting times of the runs of each test
+        self.runs: dict[str, list[tuple[str, float]]] = {}
+        self.entries = 0
+        self.items = 0
+
+    def load(self, file: TextIO):
+        for line in file:
+            entry = LOG_ENTRY.match(line)
+            if entry == None:
+                continue
+            self.entries += 1
+            time_ms, tag, kind, text = entry.groups()
+            tag = tag or ""
+            if kind == "TEST":
+                self.runs.setdefault(text, []).append((tag, 0.001 * int(time_ms)))
+            elif kind == "EVENT":
+                # Events are logged as their severity, their name and their value
+                severity, _, rest = text.partition(" ")
+                name, _, value = rest.partition(" ")
+                self.add(tag, 0, [name, severity], self.event_interest, time_ms, text, value)
+            elif kind == "TELEMETRY":
+                name, _, value = text.partition(" ")
+                self.add(tag, 1, [name], self.channel_interest, time_ms, text, value)
+
+    def add(self, tag: str, kind: int, keys: list[str], interest: set[str] | None, time_ms: str, text: str, value: str):
+        # Filtered before anything else, as most entries of a busy session are of no interest
+        if interest != None and interest.isdisjoint(keys):
+            return
+        item = LoggedItem(0.001 * int(time_ms), text, unquote(value))
+        index = self.indexes.setdefault(tag, (HistoryIndex(), HistoryIndex()))[kind]
+        for key in keys:
+            index.add(key, item.time, item)
+        self.items += 1
+
+    def starting_times(self, name: str) -> list[tuple[str, float]]:
+        """Return the endpoint tags and starting times of the recorded runs of test name."""
+        if name in self.runs:
+            return self.runs[name]
+        # Logs without test markers are taken as recording a single test, started with the log
+        if len(self.runs) == 0:
+            return [("", 0.0)]
+        return []
+
+    def validate(self, seq: Sequence, out: TextIO | None = None) -> bool:
+        """Validate seq against each of its recorded runs, and return whether they all pass."""
+        runs = self.starting_times(seq.name)
+        success = len(runs) > 0
+        for tag, starting_time in runs:
+            header = f" [REPLAYING TEST {seq.name}{f' [{tag}]' if tag != '' else ''}] "
+            print(f"{header:=^80s}", file=out)
+            event_index, telemetry_index = self.indexes.get(tag, (HistoryIndex(), HistoryIndex()))
+            event_verdicts, telemetry_verdicts = validate_history(seq, event_index, telemetry_index, starting_time, ROUNDING_MARGIN_S)
+            run_success = print_report(event_verdicts, telemetry_verdicts, starting_time, out, logged_item_to_str, logged_item_to_str)
+            footer = f" [TEST {seq.name} {'PASSED' if run_success else 'FAILED'}] "
+            print(f"{make_green(footer) if run_success else make_red(footer):=^89s}", file=out)
+            success &= run_success
+        if len(runs) == 0:
+            print(make_red(f"No recorded run of test {seq.name}"), file=out)
+        return success
@@ -0,0 +1,94 @@
+import math
+import time
+from dataclasses import dataclass
+from typing import Callable
+
+from fprime_test_sequencer.clock import WALL_CLOCK, Clock
+from fprime_test_sequencer.parser.parser import CommandInstruction, UplinkInstruction
+
+
+# Coarse sleeps end this long before the dispatch time, the rest is spent spinning
+SPIN_THRESHOLD_S = 0.002
+JITTER_WARNING_MS = 10
+
+
+@dataclass
+class Dispatch:
+    """Scheduled and actual dispatch times of an instruction, relative to the start of its sequence."""
+    instr: CommandInstruction | UplinkInstruction
+    scheduled_ms: int
+    actual_ms: float
+    # Wall clock time of the dispatch, comparable to the reception time of events and telemetry
+    time: float
+
+    def jitter_ms(self) -> float:
+        return self.actual_ms - self.scheduled_ms
+
+
+def percentile(values: list[float], q: float) -> float:
+    """Return the q-th quantile of sorted values, using the nearest-rank method."""
+    return values[max(0, math.ceil(q * len(values)) - 1)]
+
+
+class Scheduler:
+    """
+    Waits for instruction dispatch times on a monotonic clock and records the actual dispatch times.
+
+    Waits are made of a coarse sleep ending shortly before the dispatch time, through the given wait
+    function, followed by a fine spin absorbing the wake-up latency of the coarse sleep. There is no
+    spin on a virtual clock, which only advances while everything waits.
+    """
+
+    def __init__(self, wait: Callable[[float], None]=time.sleep, interrupted: Callable[[], bool]=lambda: False, clock: Clock=WALL_CLOCK) -> None:
+        self.wait = wait
+        self.interrupted = interrupted
+        self.clock = clock
+        self.spin_threshold_s = 0 if clock.virtual else SPIN_THRESHOLD_S
+        self.starting_time = clock.time()
+        self.origin = clock.monotonic()
+        self.dispatches: list[Dispatch] = []
+        # Called with each dispatch as soon as it is recorded
+        self.listeners: list[Callable[[Dispatch], None]] = []
+        # Called with the name and the starting time of each run
+        self.start_listeners: list[Callable[[str, float], None]] = []
+
+    def start(self, starting_time: float, name: str = ""):
+        """Start a new run, of the sequence called name, at the given wall clock time."""
+        self.origin = self.clock.monotonic() - (self.clock.time() - starting_time)
+        self.starting_time = starting_time
+        self.dispatches = []
+        for listener in self.start_listeners:
+            listener(name, starting_time)
+
+    def elapsed_ms(self) -> float:
+        return 1000 * (self.clock.monotonic() - self.origin)
+
+    def wait_until(self, time_ms: int) -> bool:
+        """Wait until time_ms after the start of the run, return False if interrupted before."""
+        deadline = self.origin + 0.001 * time_ms
+        while (remaining := deadline - self.clock.monotonic()) > self.spin_threshold_s:
+            self.wait(remaining - self.spin_threshold_s)
+            if self.interrupted():
+                return False
+        # Busy wait, without releasing the GIL which would take up to a switch interval to get back
+        while self.clock.monotonic() < deadline:
+            pass
+        return not self.interrupted()
+
+    def record(self, instr: CommandInstruction | UplinkInstruction, scheduled_ms: int) -> Dispatch:
+        elapsed_s = self.clock.monotonic() - self.origin
+        dispatch = Dispatch(instr, scheduled_ms, 1000 * elapsed_s, self.starting_time + elapsed_s)
+        self.dispatches.append(dispatch)
+        for listener in self.listeners:
+            listener(dispatch)
+        return dispatch
+
+    def max_jitter_ms(self) -> float:
+        return max((d.jitter_ms() for d in self.dispatches), default=0)
+
+    def jitter_report(self) -> str:
+        jitters = sorted(d.jitter_ms() for d in self.dispatches)
+        if len(jitters) == 0:
+            return "No instruction dispatched"
+        percentiles = ", ".join(f"p{round(100 * q)} {percentile(jitters, q):.3f} ms" for q in (0.5, 0.9, 0.99))
+        return f"Dispatch jitter over {len(jitters)} instruction(s): {percentiles}, max {jitters[-1]:.3f} ms"
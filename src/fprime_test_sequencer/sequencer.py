@@ -1,43 +1,129 @@
-import os
-from pathlib import Path
-import re
 import time
-import shutil
+from typing import TextIO
 
 from fprime_gds.common.data_types.ch_data import ChData
 from fprime_gds.common.data_types.event_data import EventData
 from fprime_gds.common.testing_fw.api import IntegrationTestAPI
+from fprime_test_sequencer.clock import WALL_CLOCK, Clock
+from fprime_test_sequencer.history import LocalTimeChronologicalHistory
 from fprime_test_sequencer.parser.parser import CommandInstruction, ExpectEventInstruction, ExpectTelemetryInstruction, Sequence, UplinkInstruction
-from fprime_test_sequencer.util import ch_data_to_str, event_data_to_str, make_green, make_red
+from fprime_test_sequencer.profiler import NO_PROFILER, Profiler, SequenceProfile
+from fprime_test_sequencer.scheduler import JITTER_WARNING_MS, Scheduler
+from fprime_test_sequencer.staging import UplinkStager
+from fprime_test_sequencer.util import make_green, make_red
+from fprime_test_sequencer.validator import StreamingValidator, Verdict, find_match, print_report, validate_history
 
 class Sequencer:
-    def __init__(self, api: IntegrationTestAPI) -> None:
+    def __init__(self, api: IntegrationTestAPI, fail_fast: bool=False, out: TextIO | None=None, clock: Clock=WALL_CLOCK,
+                 profiler: Profiler=NO_PROFILER) -> None:
         self.api = api
+        self.fail_fast = fail_fast
+        self.out = out
+        self.clock = clock
+        self.profiler = profiler
+        # Profile of the running sequence, None unless profiling
+        self.profile: SequenceProfile | None = None
+        self.validator = StreamingValidator(out, clock, profiler)
+        self.stager = UplinkStager(self.api.pipeline.up_store)
+        self.scheduler = Scheduler(
+            wait=lambda timeout: self.validator.wait(timeout, self.fail_fast),
+            interrupted=lambda: self.validator.aborted(self.fail_fast),
+            clock=clock
+        )
+        # Registered after the local time histories, so that received items are already stamped
+        self.api.pipeline.coders.register_event_consumer(self.validator.event_consumer)
+        self.api.pipeline.coders.register_channel_consumer(self.validator.channel_consumer)
+        # Received items are only kept while they can still satisfy an expectation
+        for history in (self.api.get_event_test_history(), self.api.get_telemetry_test_history()):
+            if isinstance(history, LocalTimeChronologicalHistory):
+                history.retain_from(self.validator.retention)
+
+
+    def redirect(self, out: TextIO | None):
+        """Print reports to out instead of the standard output."""
+        self.out = out
+        self.validator.out = out
+
+
+    def close(self):
+        """Stop consuming the items received by the pipeline, which may then be used by another sequencer."""
+        self.api.pipeline.coders.remove_event_consumer(self.validator.event_consumer)
+        self.api.pipeline.coders.remove_channel_consumer(self.validator.channel_consumer)
+        for history in (self.api.get_event_test_history(), self.api.get_telemetry_test_history()):
+            if isinstance(history, LocalTimeChronologicalHistory):
+                history.retain_from(None)
 
 
     def run_and_validate_sequence(self, seq: Sequence) -> bool:
         header = f" [RUNNING TEST {seq.name}] "
-        print(f"{header:=^80s}")
+        print(f"{header:=^80s}", file=self.out)
+
+        self.profile = self.profiler.sequence(seq)
+        history_counts = self.history_counts()
+
+        # Uplinked files are staged before the sequence clock starts, so that dispatching them is a pure enqueue
+        with self.profiler.phase("staging", self.profile):
+            staged = self.stage_uplinks(seq)
+
+        starting_time = self.clock.time()
+        end_time = starting_time + 0.001 * seq.get_duration()
+        self.validator.start(seq, starting_time, self.profile)
+        self.run_sequence(seq, starting_time, staged)
+        self.stager.discard(list(staged.values()))
+
+        if not self.validator.aborted(self.fail_fast):
+            print(f"Waiting up to {max(0, end_time - self.clock.time()):.2f} seconds for the sequence to finish...", file=self.out)
+            with self.profiler.phase("settling", self.profile):
+                self.validator.wait_until_settled(end_time, self.fail_fast)
+        if self.validator.aborted(self.fail_fast):
+            print(make_red("Expectation failed, aborting sequence"), file=self.out)
+        elif (time_saved := end_time - self.clock.time()) > 0:
+            print(f"All expectations settled, ending sequence {time_saved:.2f} seconds early", file=self.out)
+        self.validator.stop()
+
+        jitter_report = self.scheduler.jitter_report()
+        if self.scheduler.max_jitter_ms() >= JITTER_WARNING_MS:
+            jitter_report = make_red(f"{jitter_report}, failures of tight windows may be timing related")
+        print(jitter_report, file=self.out)
+
+        with self.profiler.phase("reporting", self.profile):
+            success = self.report(self.validator.event_verdicts, self.validator.telemetry_verdicts, starting_time)
 
-        starting_time = time.time()
-        self.run_sequence(seq)
+        footer = f" [TEST {seq.name} {'PASSED' if success else 'FAILED'}] "
+        print(f"{make_green(footer) if success else make_red(footer):=^89s}", file=self.out)
 
-        remaining_time = max(0, starting_time + 0.001 * seq.get_duration() - time.time())
-        print(f"Waiting {remaining_time:.2f} seconds for the sequence to finish...")
-        time.sleep(remaining_time)
+        if self.profile != None:
+            self.profile.success = success
+            self.profile.history = {name: count - history_counts.get(name, 0) for name, count in self.history_counts().items()}
+            self.profiler.add("validation", self.profile.validation_seconds, self.profile)
+            self.profile = None
 
-        success = self.validate_sequence(seq, starting_time)
+        return success
 
-        footer = f" [TEST {seq.name} {'PASSED' if success else 'FAILED'}] "
-        print(f"{make_green(footer) if success else make_red(footer):=^89s}")
 
-        return success
+    def history_counts(self) -> dict[str, int]:
+        """Return the numbers of received items ignored and evicted so far by the local time histories."""
+        counts = {}
+        for kind, history in (("event", self.api.get_event_test_history()), ("telemetry", self.api.get_telemetry_test_history())):
+            if isinstance(history, LocalTimeChronologicalHistory):
+                counts[f"{kind}_ignored"] = history.ignored
+                counts[f"{kind}_evicted"] = history.evicted
+        return counts
 
 
-    def run_sequence(self, seq: Sequence):
-        starting_time_s = time.time()
-        def elapsed_time_s():
-            return time.time() - starting_time_s
+    def stage_uplinks(self, seq: Sequence) -> dict[int, str]:
+        if len(seq.uplink_instrs) == 0:
+            return {}
+        staging_start = time.perf_counter()
+        staged = self.stager.stage(seq.uplink_instrs)
+        print(f"Staged {len(staged)} uplink file(s) in {1000 * (time.perf_counter() - staging_start):.1f} ms", file=self.out)
+        return staged
+
+
+    def run_sequence(self, seq: Sequence, starting_time: float | None=None, staged: dict[int, str] | None=None):
+        if staged == None:
+            staged = self.stage_uplinks(seq)
+        self.scheduler.start(starting_time if starting_time != None else self.clock.time(), seq.name)
 
         instructions: list[tuple[int, CommandInstruction | UplinkInstruction]] = []
 
@@ -54,72 +140,42 @@ class Sequencer:
         # Sort instructions by execution time
         instructions.sort(key=lambda e: e[0])
 
-        max_exec_time_digits = len(str(instructions[-1][0]))
+        max_exec_time_digits = len(str(instructions[-1][0])) if len(instructions) > 0 else 1
 
         for exec_time, instr in instructions:
-            # Sleep until next instruction
-            time.sleep(max(0.001 * exec_time - elapsed_time_s(), 0))
+            # Wait until next instruction
+            with self.profiler.phase("sleeping", self.profile):
+                if not self.scheduler.wait_until(exec_time):
+                    return
             # Execute instruction
-            if type(instr) == CommandInstruction:
-                print(f"[{round(1000 * elapsed_time_s()):{max_exec_time_digits}} ms]: Sending command {instr.command} {' '.join(instr.args)}")
-                self.api.send_command(instr.command, instr.args)
-            elif type(instr) == UplinkInstruction:
-                print(f"[{round(1000 * elapsed_time_s()):{max_exec_time_digits}} ms]: Uplinking file {instr.file} to {instr.dest}")
-                tmp_file = str(self.api.pipeline.up_store) + "/" + Path(instr.file).name
-                shutil.copyfile(instr.file, tmp_file)
-                self.api.pipeline.files.uplinker.enqueue(tmp_file, instr.dest)
+            with self.profiler.phase("dispatching", self.profile):
+                self.execute(instr, exec_time, staged, max_exec_time_digits)
+
+
+    def execute(self, instr: CommandInstruction | UplinkInstruction, exec_time: int, staged: dict[int, str], max_exec_time_digits: int):
+        dispatch = self.scheduler.record(instr, exec_time)
+        if type(instr) == CommandInstruction:
+            self.clock.sent()
+            self.api.send_command(instr.command, instr.args)
+            print(f"[{round(dispatch.actual_ms):{max_exec_time_digits}} ms]: Sent command {instr.command} {' '.join(instr.args)}", file=self.out)
+        elif type(instr) == UplinkInstruction:
+            # Handed over to the uplinker, which removes the staged file once done
+            self.clock.sent()
+            self.api.pipeline.files.uplinker.enqueue(staged.pop(id(instr)), instr.dest)
+            print(f"[{round(dispatch.actual_ms):{max_exec_time_digits}} ms]: Uplinked file {instr.file} to {instr.dest}", file=self.out)
 
 
     def find_matching_event(self, event: ExpectEventInstruction, starting_time: float) -> EventData | None:
-        for received_event in self.api.get_event_test_history().retrieve():
-            match_ = True
-            match_ &= 0.001 * event.start_time_ms <= received_event.get_time().get_float() - starting_time <= 0.001 * event.end_time_ms
-            match_ &= event.event == received_event.get_severity() or event.event == received_event.template.get_full_name()
-            if event.expected_value != None:
-                if event.is_regex:
-                    match_ &= re.search(event.expected_value, received_event.get_display_text()) != None
-                else:
-                    match_ &= event.expected_value == received_event.get_display_text()
-            if match_:
-                return received_event
-        return None
+        return find_match(self.api.get_event_test_history().index, event, starting_time)
 
     def find_matching_telemetry(self, telemetry: ExpectTelemetryInstruction, starting_time: float) -> ChData | None:
-        for received_telemetry in self.api.get_telemetry_test_history().retrieve():
-            match_ = True
-            match_ &= 0.001 * telemetry.start_time_ms <= received_telemetry.get_time().get_float() - starting_time <= 0.001 * telemetry.end_time_ms
-            match_ &= telemetry.channel == received_telemetry.template.get_full_name()
-            if telemetry.expected_value != None:
-                if telemetry.is_regex:
-                    match_ &= re.search(telemetry.expected_value, str(received_telemetry.get_display_text())) != None
-                else:
-                    match_ &= telemetry.expected_value == received_telemetry.get_display_text()
-            if match_:
-                return received_telemetry
-        return None
+        return find_match(self.api.get_telemetry_test_history().index, telemetry, starting_time)
 
 
     def validate_sequence(self, seq: Sequence, starting_time: float) -> bool:
-        success = True
-
-        print(f"{' [VALIDATING EVENTS] ':-^80s}")
-
-        for expected_event in seq.event_instrs:
-            matching_event = self.find_matching_event(expected_event, starting_time)
-            success &= (matching_event != None) == expected_event.is_expected
-
-            result = f"{make_green('[OK]') if (matching_event != None) == expected_event.is_expected else make_red('[FAIL]')}"
-            match_ = event_data_to_str(matching_event, starting_time) if matching_event is not None else "None"
-            print(f"{expected_event}: {result} ~> {match_}")
+        event_verdicts, telemetry_verdicts = validate_history(seq, self.api.get_event_test_history().index, self.api.get_telemetry_test_history().index, starting_time)
+        return self.report(event_verdicts, telemetry_verdicts, starting_time)
 
-        print(f"{' [VALIDATING TELEMETRY] ':-^80s}")
 
-        for expected_telemetry in seq.telemetry_instrs:
-            matching_telemetry = self.find_matching_telemetry(expected_telemetry, starting_time)
-            success &= (matching_telemetry != None) == expected_telemetry.is_expected
-
-            result = f"{make_green('[OK]') if (matching_telemetry  != None) == expected_telemetry.is_expected else make_red('[FAIL]')}"
-            match_ = ch_data_to_str(matching_telemetry, starting_time) if matching_telemetry is not None else "None"
-            print(f"{expected_telemetry}: {result} ~> {match_}")
-
-        return success
+    def report(self, event_verdicts: list[Verdict], telemetry_verdicts: list[Verdict], starting_time: float) -> bool:
+        return print_report(event_verdicts, telemetry_verdicts, starting_time, self.out)
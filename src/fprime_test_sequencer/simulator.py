@@ -0,0 +1,350 @@
+import argparse
+import heapq
+import itertools
+import json
+import math
+import os
+import socket
+import socketserver
+import struct
+import threading
+import time
+
+from fprime.common.models.serialize.bool_type import BoolType
+from fprime.common.models.serialize.enum_type import EnumType
+from fprime.common.models.serialize.numerical_types import FloatType, I32Type, IntegerType, U32Type
+from fprime.common.models.serialize.string_type import StringType
+from fprime.common.models.serialize.time_type import TimeBase, TimeType
+from fprime_gds.common.data_types.ch_data import ChData
+from fprime_gds.common.data_types.event_data import EventData
+from fprime_gds.common.encoders.ch_encoder import ChEncoder
+from fprime_gds.common.encoders.event_encoder import EventEncoder
+from fprime_gds.common.pipeline.dictionaries import Dictionaries
+from fprime_gds.common.templates.ch_template import ChTemplate
+from fprime_gds.common.templates.event_template import EventTemplate
+from fprime_gds.common.utils.config_manager import ConfigManager
+from fprime_gds.common.utils.data_desc_type import DataDescType
+from fprime_test_sequencer.clock import WALL_CLOCK, Clock
+from fprime_test_sequencer.dictionaries import DictionaryCache, load_dictionaries
+
+
+# Background telemetry is emitted in batches, once per period
+TELEMETRY_PERIOD_S = 0.01
+# Key prefixing the packets sent by the ground to the flight software
+PACKET_KEY = 0x5A5A5A5A
+FILE_PACKET_START = 0
+FILE_PACKET_DATA = 1
+FILE_PACKET_END = 2
+
+
+def default_value(arg_type: type):
+    if issubclass(arg_type, BoolType):
+        return False
+    if issubclass(arg_type, (IntegerType, FloatType)):
+        return 0
+    if issubclass(arg_type, StringType):
+        return ""
+    if issubclass(arg_type, EnumType):
+        return next(iter(arg_type.ENUM_DICT.keys()))
+    raise ValueError(f"No default value for arguments of type {arg_type.__name__}")
+
+
+def make_time(time_s: float) -> TimeType:
+    return TimeType(TimeBase["TB_WORKSTATION_TIME"].value, 0, int(time_s), int(1e6 * (time_s % 1)))
+
+
+class Response:
+    """An event or a telemetry value sent delay_ms after a command is dispatched."""
+
+    def __init__(self, template: EventTemplate | ChTemplate, delay_ms: float, values: list) -> None:
+        self.template = template
+        self.delay_ms = delay_ms
+        # Converted once, so that invalid scripts fail when loaded
+        if isinstance(template, EventTemplate):
+            self.values = tuple(arg_type(value) for (_, _, arg_type), value in zip(template.get_args(), values, strict=True))
+        else:
+            self.value = template.get_type_obj()(values[0])
+
+    def data(self, time_s: float) -> EventData | ChData:
+        if isinstance(self.template, EventTemplate):
+            return EventData(self.values, make_time(time_s), self.template)
+        return ChData(self.value, make_time(time_s), self.template)
+
+
+class SimulatedDeployment:
+    """
+    Stand-in for an F´ deployment behind a fprime-gds threaded TCP server, for benchmarks and CI.
+
+    GDS clients connect and register as they would with the threaded TCP server. Commands are
+    answered with OpCodeDispatched, the responses scripted for them and OpCodeCompleted, file
+    uplink packets are acknowledged with handshakes, and background telemetry is emitted at a
+    configurable rate. Everything sent is broadcast to all registered GUI clients.
+
+    On a virtual clock, shared with the sequencer, items sent and received are accounted for so that
+    time only advances once they are all handled.
+    """
+
+    def __init__(self, dictionary: str, addr: str = "0.0.0.0", port: int = 50050, latency_ms: float = 1.0,
+                 script: dict[str, list[dict]] | None = None, telemetry_rate: float = 0, telemetry_channels: list[str] | None = None,
+                 clock: Clock = WALL_CLOCK, dictionaries: Dictionaries | None = None) -> None:
+        self.clock = clock
+        # Dictionaries already loaded from dictionary may be shared with the pipelines of a run
+        self.dictionaries = dictionaries if dictionaries != None else load_dictionaries(dictionary)[0]
+        self.config = ConfigManager()
+        self.event_encoder = EventEncoder(self.config)
+        self.ch_encoder = ChEncoder(self.config)
+        self.latency_ms = latency_ms
+        self.opcode_dispatched = self.find_event("OpCodeDispatched")
+        self.opcode_completed = self.find_event("OpCodeCompleted")
+        self.invalid_command = self.find_event("InvalidCommand")
+        self.file_received = self.find_event("FileReceived")
+        self.responses = {name: [self.load_response(response) for response in responses] for name, responses in (script or {}).items()}
+        for name in self.responses.keys():
+            if name not in self.dictionaries.command_name:
+                raise ValueError(f"Unknown command {name} in script")
+
+        self.telemetry_rate = telemetry_rate
+        if telemetry_channels == None:
+            telemetry_channels = [name for name, template in self.dictionaries.channel_name.items()
+                                  if issubclass(template.get_type_obj(), (IntegerType, FloatType, BoolType))]
+        self.telemetry_channels = [self.dictionaries.channel_name[name] for name in telemetry_channels]
+        if telemetry_rate > 0 and len(self.telemetry_channels) == 0:
+            raise ValueError("No channel to send background telemetry on")
+
+        self.lock = threading.Lock()
+        self.clients: list[socket.socket] = []
+        # Packets to send by sending time, with the number of packets sent back in reply
+        self.scheduled: list[tuple[float, int, bytes, int]] = []
+        self.counter = itertools.count()
+        self.wakeup = threading.Condition(self.lock)
+        self.stopped = False
+        self.commands_received = 0
+        # Files are uplinked one at a time
+        self.uplink_destination = ""
+        self.items_sent = 0
+
+        self.server = socketserver.ThreadingTCPServer((addr, port), RequestHandler, bind_and_activate=False)
+        self.server.allow_reuse_address = True
+        self.server.daemon_threads = True
+        self.server.server_bind()
+        self.server.server_activate()
+        self.server.deployment = self
+        self.server_thread = threading.Thread(target=self.server.serve_forever, name="simulator server", daemon=True)
+        self.emitter = threading.Thread(target=self.emit, name="simulator emitter", daemon=True)
+
+    @property
+    def address(self) -> tuple[str, int]:
+        return self.server.server_address[:2]
+
+    def find_event(self, name: str) -> EventTemplate | None:
+        return next((template for full_name, template in self.dictionaries.event_name.items() if full_name.split(".")[-1] == name), None)
+
+    def load_response(self, response: dict) -> Response:
+        delay_ms = response.get("delay_ms", 0)
+        if "event" in response:
+            template = self.dictionaries.event_name[response["event"]]
+            values = response.get("args", [default_value(arg_type) for _, _, arg_type in template.get_args()])
+            return Response(template, delay_ms, values)
+        template = self.dictionaries.channel_name[response["channel"]]
+        return Response(template, delay_ms, [response.get("value", default_value(template.get_type_obj()))])
+
+    def start(self):
+        self.server_thread.start()
+        # Joined before the emitter starts, so that the clock doesn't advance without it
+        self.clock.join()
+        self.emitter.start()
+
+    def stop(self):
+        with self.lock:
+            self.stopped = True
+            self.clock.notify(self.wakeup)
+        self.server.shutdown()
+        self.server.server_close()
+        self.emitter.join()
+        with self.lock:
+            for client in self.clients:
+                client.close()
+            self.clients = []
+
+    def add_client(self, client: socket.socket):
+        with self.lock:
+            self.clients.append(client)
+
+    def remove_client(self, client: socket.socket):
+        with self.lock:
+            if client in self.clients:
+                self.clients.remove(client)
+
+    def schedule(self, time_s: float, data: EventData | ChData | bytes, replies: int = 0):
+        with self.lock:
+            # Encoders aren't thread safe, and commands are received by one thread per client
+            if isinstance(data, EventData):
+                data = self.event_encoder.encode_api(data)
+            elif isinstance(data, ChData):
+                data = self.ch_encoder.encode_api(data)
+            heapq.heappush(self.scheduled, (time_s, next(self.counter), data, replies))
+            self.clock.notify(self.wakeup)
+
+    def on_command(self, opcode: int, received_s: float):
+        self.commands_received += 1
+        dispatched_s = received_s + 0.001 * self.latency_ms
+        if opcode not in self.dictionaries.command_id:
+            if self.invalid_command != None:
+                self.schedule(dispatched_s, EventData((I32Type(opcode),), make_time(dispatched_s), self.invalid_command))
+            self.clock.received()
+            return
+        if self.opcode_dispatched != None:
+            self.schedule(dispatched_s, EventData((U32Type(opcode), I32Type(0)), make_time(dispatched_s), self.opcode_dispatched))
+        responses = self.responses.get(self.dictionaries.command_id[opcode].get_full_name(), [])
+        for response in responses:
+            response_s = dispatched_s + 0.001 * response.delay_ms
+            self.schedule(response_s, response.data(response_s))
+        # Commands complete with their last response
+        completed_s = dispatched_s + 0.001 * max((response.delay_ms for response in responses), default=0)
+        if self.opcode_completed != None:
+            self.schedule(completed_s, EventData((U32Type(opcode),), make_time(completed_s), self.opcode_completed))
+        self.clock.received()
+
+    def on_file_packet(self, packet: bytes, received_s: float):
+        # Packets are processed like commands, and the uplinker ignores handshakes arriving before it is done sending
+        processed_s = received_s + 0.001 * self.latency_ms
+        # Handshakes echo the packet, as the uplinker waits for them before sending the next one, except after the end packet
+        handshake = U32Type(DataDescType["FW_PACKET_HAND"].value).serialize() + packet
+        replies = 1 if packet[4] in (FILE_PACKET_START, FILE_PACKET_DATA) else 0
+        self.schedule(processed_s, struct.pack(">I", len(handshake)) + handshake, replies)
+        if packet[4] == FILE_PACKET_START:
+            # Start packets are made of the file size and of the source and destination paths, prefixed with their lengths
+            source_length = packet[13]
+            destination_length = packet[14 + source_length]
+            self.uplink_destination = packet[15 + source_length:15 + source_length + destination_length].decode()
+        elif packet[4] == FILE_PACKET_END and self.file_received != None:
+            values = tuple(arg_type(self.uplink_destination if issubclass(arg_type, StringType) else default_value(arg_type))
+                           for _, _, arg_type in self.file_received.get_args())
+            self.schedule(processed_s, EventData(values, make_time(processed_s), self.file_received))
+        self.clock.received()
+
+    def emit(self):
+        """Send scheduled packets when due, and background telemetry once per period."""
+        telemetry_encoder = ChEncoder(self.config)
+        next_batch_s = self.clock.time()
+        emitted = 0.0
+        values = itertools.count()
+        while True:
+            with self.lock:
+                while not self.stopped:
+                    deadline = self.scheduled[0][0] if len(self.scheduled) > 0 else math.inf
+                    if self.telemetry_rate > 0:
+                        deadline = min(deadline, next_batch_s)
+                    if deadline <= self.clock.time():
+                        break
+                    self.clock.wait(self.wakeup, None if deadline == math.inf else deadline - self.clock.time())
+                if self.stopped:
+                    self.clock.leave()
+                    return
+                now = self.clock.time()
+                due = []
+                replies = 0
+                while len(self.scheduled) > 0 and self.scheduled[0][0] <= now:
+                    _, _, data, data_replies = heapq.heappop(self.scheduled)
+                    due.append(data)
+                    replies += data_replies
+
+            if self.telemetry_rate > 0 and next_batch_s <= now:
+                # Carry the fractional items over to the next batch to keep the average rate
+                emitted += self.telemetry_rate * TELEMETRY_PERIOD_S
+                for _ in range(int(emitted)):
+                    n = next(values)
+                    template = self.telemetry_channels[n % len(self.telemetry_channels)]
+                    value = n % 2 == 0 if issubclass(template.get_type_obj(), BoolType) else n % 100
+                    due.append(telemetry_encoder.encode_api(ChData(template.get_type_obj()(value), make_time(now), template)))
+                emitted -= int(emitted)
+                next_batch_s += TELEMETRY_PERIOD_S
+
+            self.send(b"".join(due), len(due), replies)
+
+    def send(self, data: bytes, nb_items: int, replies: int = 0):
+        with self.lock:
+            # Each client receives every item, and the uplinker replies to handshakes
+            self.clock.sent(nb_items * len(self.clients) + replies)
+            for client in list(self.clients):
+                try:
+                    client.sendall(data)
+                except OSError:
+                    self.clients.remove(client)
+            self.items_sent += nb_items
+
+
+class RequestHandler(socketserver.StreamRequestHandler):
+    """Speaks the threaded TCP server protocol with a single client."""
+
+    def handle(self):
+        deployment: SimulatedDeployment = self.server.deployment
+        registration = self.rfile.readline().split()
+        if len(registration) != 2 or registration[0] != b"Register":
+            return
+        if b"GUI" in registration[1]:
+            deployment.add_client(self.request)
+        try:
+            while (header := self.rfile.read(5)) != b"":
+                # Client listings and quit requests are ignored
+                if header != b"A5A5 ":
+                    continue
+                destination = self.rfile.read(4).strip()
+                if destination == b"FSW":
+                    key, size = struct.unpack(">II", self.rfile.read(8))
+                    packet = self.rfile.read(size)
+                    received_s = deployment.clock.time()
+                    if key != PACKET_KEY or len(packet) < 4:
+                        continue
+                    descriptor = struct.unpack(">I", packet[:4])[0]
+                    if descriptor == DataDescType["FW_PACKET_COMMAND"].value:
+                        deployment.on_command(struct.unpack(">I", packet[4:8])[0], received_s)
+                    elif descriptor == DataDescType["FW_PACKET_FILE"].value:
+                        deployment.on_file_packet(packet, received_s)
+                else:
+                    size = struct.unpack(">I", self.rfile.read(4))[0]
+                    self.rfile.read(size)
+        except (OSError, struct.error):
+            pass
+        finally:
+            deployment.remove_client(self.request)
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Simulated F´ deployment behind a fprime-gds threaded TCP server, for benchmarks and CI")
+    parser.add_argument("-d", "--dictionary", required=True, help="path to dictionary")
+    parser.add_argument("--tts-addr", default="0.0.0.0", help="address to listen on [default: 0.0.0.0]")
+    parser.add_argument("--tts-port", type=int, default=50050, help="port to listen on [default: 50050]")
+    parser.add_argument("--latency-ms", type=float, default=1.0, help="delay between receiving and dispatching a command [default: 1]")
+    parser.add_argument("--script", help="JSON file mapping command names to the events and telemetry sent in response")
+    parser.add_argument("--telemetry-rate", type=float, default=0, help="background telemetry items sent per second [default: 0]")
+    parser.add_argument("--telemetry-channel", action="append", help="channel of the background telemetry, repeat for several [default: all numeric channels]")
+    args = parser.parse_args()
+
+    if not os.path.exists(args.dictionary):
+        print(f"Dictionary file {args.dictionary} does not exist")
+        exit()
+
+    script = None
+    if args.script is not None:
+        with open(args.script) as f:
+            script = json.load(f)
+
+    dictionaries, _ = load_dictionaries(args.dictionary, DictionaryCache())
+    deployment = SimulatedDeployment(args.dictionary, args.tts_addr, args.tts_port, args.latency_ms, script,
+                                     args.telemetry_rate, args.telemetry_channel, dictionaries=dictionaries)
+    deployment.start()
+    addr, port = deployment.address
+    print(f"Simulating deployment on {addr}:{port}, press Ctrl-C to stop")
+    try:
+        while True:
+            time.sleep(1)
+    except KeyboardInterrupt:
+        pass
+    finally:
+        deployment.stop()
+        print(f"Received {deployment.commands_received} command(s), sent {deployment.items_sent} item(s)")
+
+
+if __name__ == "__main__":
+    main()
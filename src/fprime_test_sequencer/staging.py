@@ -0,0 +1,97 @@
+import errno
+import hashlib
+import itertools
+import os
+import shutil
+from functools import lru_cache
+from pathlib import Path
+
+try:
+    import fcntl
+except ImportError:
+    fcntl = None
+
+from fprime_test_sequencer.parser.parser import UplinkInstruction
+
+
+# ioctl request cloning a file into another on filesystems with reflink support (btrfs, xfs, ...)
+FICLONE = 0x40049409
+STORE_DIRNAME = ".staged"
+
+
+@lru_cache(maxsize=None)
+def file_digest(path: str, size: int, mtime_ns: int, inode: int) -> str:
+    """Return the SHA-256 digest of a file, memoized for the session as long as the file is unchanged."""
+    with open(path, 'rb') as f:
+        return hashlib.file_digest(f, "sha256").hexdigest()
+
+
+def reflink(src: Path, dst: Path):
+    if fcntl == None:
+        raise OSError(errno.EOPNOTSUPP, "Reflinks are not supported on this platform")
+    with open(src, 'rb') as src_f, open(dst, 'wb') as dst_f:
+        try:
+            fcntl.ioctl(dst_f.fileno(), FICLONE, src_f.fileno())
+        except OSError:
+            dst_f.close()
+            dst.unlink(missing_ok=True)
+            raise
+
+
+def clone(src: Path, dst: Path) -> str:
+    """Make dst a copy of src, through a reflink or a hardlink when possible, and return the method used."""
+    for method, clone_ in (("reflink", reflink), ("hardlink", os.link)):
+        try:
+            clone_(src, dst)
+            return method
+        except OSError:
+            pass
+    shutil.copyfile(src, dst)
+    return "copy"
+
+
+class UplinkStager:
+    """
+    Stages the source files of uplinks in the uplink store before their sequence starts.
+
+    Source files are added once per session to a content addressed store, from which each uplink
+    gets its own link, as the uplinker removes its source file once done.
+    """
+
+    def __init__(self, up_store: Path) -> None:
+        self.up_store = Path(up_store)
+        self.store = self.up_store / STORE_DIRNAME
+        self.counter = itertools.count()
+        self.methods: dict[str, int] = {}
+        # Start each session from an empty store
+        shutil.rmtree(self.store, ignore_errors=True)
+
+    def object_path(self, file: str) -> Path:
+        """Return the path of the file in the store, adding it first if needed."""
+        stat = os.stat(file)
+        obj = self.store / file_digest(os.path.realpath(file), stat.st_size, stat.st_mtime_ns, stat.st_ino)
+        if not obj.exists():
+            self.store.mkdir(parents=True, exist_ok=True)
+            tmp_obj = obj.with_suffix(".tmp")
+            tmp_obj.unlink(missing_ok=True)
+            self.count(clone(Path(file), tmp_obj))
+            os.replace(tmp_obj, obj)
+        return obj
+
+    def stage(self, uplinks: list[UplinkInstruction]) -> dict[int, str]:
+        """Stage the given uplinks, returning the staged file of each, by instruction id."""
+        staged: dict[int, str] = {}
+        for up in uplinks:
+            obj = self.object_path(up.file)
+            link = self.up_store / f"{obj.name[:16]}-{next(self.counter)}-{Path(up.file).name}"
+            self.count(clone(obj, link))
+            staged[id(up)] = str(link)
+        return staged
+
+    def discard(self, staged_files: list[str]):
+        """Remove staged files which were never handed to the uplinker."""
+        for staged_file in staged_files:
+            Path(staged_file).unlink(missing_ok=True)
+
+    def count(self, method: str):
+        self.methods[method] = self.methods.get(method, 0) + 1
@@ -1,5 +1,11 @@
-from fprime_gds.common.data_types.ch_data import ChData
-from fprime_gds.common.data_types.event_data import EventData
+from __future__ import annotations
+
+from typing import TYPE_CHECKING
+
+# Used by the syntax check, which doesn't import fprime-gds
+if TYPE_CHECKING:
+    from fprime_gds.common.data_types.ch_data import ChData
+    from fprime_gds.common.data_types.event_data import EventData
 
 
 def make_green(s: str) -> str:
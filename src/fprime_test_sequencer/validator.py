@@ -0,0 +1,292 @@
+import heapq
+import threading
+import time
+from dataclasses import dataclass
+from typing import Callable, TextIO
+
+from fprime_gds.common.data_types.ch_data import ChData
+from fprime_gds.common.data_types.event_data import EventData
+from fprime_gds.common.handlers import DataHandler
+from fprime_test_sequencer.clock import WALL_CLOCK, Clock
+from fprime_test_sequencer.history import HistoryIndex, ch_index_keys, event_index_keys
+from fprime_test_sequencer.parser.parser import ExpectEventInstruction, ExpectTelemetryInstruction, Sequence
+from fprime_test_sequencer.parser.windows import WindowIndex
+from fprime_test_sequencer.profiler import NO_PROFILER, ExpectationCost, Profiler, SequenceProfile
+from fprime_test_sequencer.util import ch_data_to_str, event_data_to_str, make_green, make_red
+
+
+@dataclass
+class Verdict:
+    """Outcome of a single expectation, final once closed."""
+    instr: ExpectEventInstruction | ExpectTelemetryInstruction
+    match: EventData | ChData | None = None
+    closed: bool = False
+    # First item not matching an expectation on all items of its window
+    mismatch: EventData | ChData | None = None
+
+    def is_universal(self) -> bool:
+        return isinstance(self.instr, ExpectTelemetryInstruction) and self.instr.is_universal
+
+    def success(self) -> bool:
+        if self.is_universal():
+            return self.match != None and self.mismatch == None
+        return (self.match != None) == self.instr.is_expected
+
+    def observe(self, item, matched: bool) -> bool:
+        """Account for an item received within the window, and return whether the verdict is settled."""
+        if not self.is_universal():
+            if matched and self.match == None:
+                self.match = item
+            return self.match != None
+        if matched and self.match == None:
+            self.match = item
+        elif not matched and self.mismatch == None:
+            self.mismatch = item
+        return self.mismatch != None
+
+    def evidence(self) -> EventData | ChData | None:
+        """Return the item the verdict is based on, if any."""
+        return self.mismatch if self.mismatch != None else self.match
+
+
+def window_bounds(instr: ExpectEventInstruction | ExpectTelemetryInstruction, starting_time: float, margin_s: float = 0) -> tuple[float, float]:
+    return starting_time + 0.001 * instr.start_time_ms - margin_s, starting_time + 0.001 * instr.end_time_ms + margin_s
+
+
+def instr_key(instr: ExpectEventInstruction | ExpectTelemetryInstruction) -> str:
+    # Events are indexed both by full name and by severity, so the expected key selects the right bucket either way
+    return instr.event if isinstance(instr, ExpectEventInstruction) else instr.channel
+
+
+def find_match(index: HistoryIndex, instr: ExpectEventInstruction | ExpectTelemetryInstruction, starting_time: float, margin_s: float = 0):
+    """Return the first item of index within the window of instr, widened by margin_s on both ends, whose value matches."""
+    for item in index.window(instr_key(instr), *window_bounds(instr, starting_time, margin_s)):
+        if instr.matches_value(str(item.get_display_text())):
+            return item
+    return None
+
+
+def judge(index: HistoryIndex, instr: ExpectEventInstruction | ExpectTelemetryInstruction, starting_time: float, margin_s: float = 0) -> Verdict:
+    """Return the verdict of instr on the items of index within its window, widened by margin_s on both ends."""
+    verdict = Verdict(instr, closed=True)
+    key = instr_key(instr)
+    start_s, end_s = window_bounds(instr, starting_time, margin_s)
+    if isinstance(instr, ExpectTelemetryInstruction) and instr.predicate != None:
+        # Numeric predicates are evaluated over the whole window at once, on the values column of the channel
+        start, end = index.span(key, start_s, end_s)
+        first_match, first_mismatch = instr.predicate.scan(index.numeric_values(key), start, end, instr.is_universal)
+        items = index.items(key)
+        verdict.match = items[first_match] if first_match != None else None
+        verdict.mismatch = items[first_mismatch] if first_mismatch != None else None
+        return verdict
+    if not verdict.is_universal():
+        verdict.match = find_match(index, instr, starting_time, margin_s)
+        return verdict
+    for item in index.window(key, start_s, end_s):
+        if verdict.observe(item, instr.matches_value(str(item.get_display_text()))):
+            break
+    return verdict
+
+
+def validate_history(seq: Sequence, event_index: HistoryIndex, telemetry_index: HistoryIndex, starting_time: float,
+                     margin_s: float = 0) -> tuple[list[Verdict], list[Verdict]]:
+    """Validate the expectations of seq, started at starting_time, against the received items of the indexes."""
+    event_verdicts = [judge(event_index, ei, starting_time, margin_s) for ei in seq.event_instrs]
+    telemetry_verdicts = [judge(telemetry_index, ti, starting_time, margin_s) for ti in seq.telemetry_instrs]
+    return event_verdicts, telemetry_verdicts
+
+
+def print_report(event_verdicts: list[Verdict], telemetry_verdicts: list[Verdict], starting_time: float, out: TextIO | None = None,
+                 event_to_str: Callable = event_data_to_str, ch_to_str: Callable = ch_data_to_str) -> bool:
+    success = True
+
+    print(f"{' [VALIDATING EVENTS] ':-^80s}", file=out)
+
+    for verdict in event_verdicts:
+        success &= verdict.success()
+
+        result = f"{make_green('[OK]') if verdict.success() else make_red('[FAIL]')}"
+        match_ = event_to_str(verdict.evidence(), starting_time) if verdict.evidence() is not None else "None"
+        print(f"{verdict.instr}: {result} ~> {match_}", file=out)
+
+    print(f"{' [VALIDATING TELEMETRY] ':-^80s}", file=out)
+
+    for verdict in telemetry_verdicts:
+        success &= verdict.success()
+
+        result = f"{make_green('[OK]') if verdict.success() else make_red('[FAIL]')}"
+        match_ = ch_to_str(verdict.evidence(), starting_time) if verdict.evidence() is not None else "None"
+        print(f"{verdict.instr}: {result} ~> {match_}", file=out)
+
+    return success
+
+
+class RetentionHorizon:
+    """
+    Earliest start of the expectation windows still open, before which received items can't satisfy
+    any expectation of the running sequence anymore. Called by the histories to evict old items.
+    """
+
+    def __init__(self, clock: Clock = WALL_CLOCK) -> None:
+        self.clock = clock
+        self.lock = threading.Lock()
+        self.running = False
+        self.starting_time = 0.0
+        # Verdicts by window start, closed ones being popped lazily
+        self.open: list[tuple[int, int, Verdict]] = []
+
+    def start(self, verdicts: list[Verdict], starting_time: float):
+        with self.lock:
+            self.running = True
+            self.starting_time = starting_time
+            self.open = [(verdict.instr.start_time_ms, idx, verdict) for idx, verdict in enumerate(verdicts)]
+            heapq.heapify(self.open)
+
+    def stop(self):
+        with self.lock:
+            self.running = False
+            self.open = []
+
+    def __call__(self) -> float:
+        with self.lock:
+            while len(self.open) > 0 and self.open[0][2].closed:
+                heapq.heappop(self.open)
+            if not self.running or len(self.open) == 0:
+                return self.clock.time()
+            return self.starting_time + 0.001 * self.open[0][0]
+
+
+class Consumer(DataHandler):
+    """Pipeline consumer forwarding received data to a callback."""
+
+    def __init__(self, callback: Callable) -> None:
+        self.callback = callback
+
+    def data_callback(self, data, sender=None):
+        self.callback(data)
+
+
+class StreamingValidator:
+    """
+    Validates the expectations of a running sequence as events and telemetry are received.
+
+    The consumers must be registered after the LocalTimeChronologicalHistory ones, so that
+    received items are already stamped with their local reception time.
+    """
+
+    def __init__(self, out: TextIO | None = None, clock: Clock = WALL_CLOCK, profiler: Profiler = NO_PROFILER) -> None:
+        self.out = out
+        self.clock = clock
+        self.changed = threading.Condition()
+        self.event_consumer = Consumer(profiler.hot(self.on_event))
+        self.channel_consumer = Consumer(profiler.hot(self.on_telemetry))
+        # Profile of the running sequence, collecting the cost of each expectation when profiling
+        self.profile: SequenceProfile | None = None
+        self.starting_time = 0.0
+        self.running = False
+        self.failed = False
+        self.event_windows = WindowIndex([], lambda ei: ei.event)
+        self.telemetry_windows = WindowIndex([], lambda ti: ti.channel)
+        self.event_verdicts: list[Verdict] = []
+        self.telemetry_verdicts: list[Verdict] = []
+        # All verdicts sorted by window end, closed in that order as time goes by
+        self.closing_order: list[tuple[Verdict, Callable]] = []
+        self.next_closing = 0
+        self.retention = RetentionHorizon(clock)
+
+    def start(self, seq: Sequence, starting_time: float, profile: SequenceProfile | None = None) -> None:
+        if seq.event_windows == None or seq.telemetry_windows == None:
+            seq.index_windows()
+        with self.changed:
+            self.starting_time = starting_time
+            self.profile = profile
+            self.failed = False
+            self.event_windows = seq.event_windows
+            self.telemetry_windows = seq.telemetry_windows
+            self.event_verdicts = [Verdict(ei) for ei in seq.event_instrs]
+            self.telemetry_verdicts = [Verdict(ti) for ti in seq.telemetry_instrs]
+            self.closing_order = sorted(
+                [(v, event_data_to_str) for v in self.event_verdicts] + [(v, ch_data_to_str) for v in self.telemetry_verdicts],
+                key=lambda e: e[0].instr.end_time_ms
+            )
+            self.next_closing = 0
+            self.running = True
+        self.retention.start(self.event_verdicts + self.telemetry_verdicts, starting_time)
+
+    def stop(self) -> None:
+        with self.changed:
+            self.close_windows(force=True)
+            self.running = False
+        self.retention.stop()
+
+    def on_event(self, data: EventData):
+        with self.changed:
+            self.on_data(data, event_index_keys(data), data.get_display_text(), self.event_windows, self.event_verdicts, event_data_to_str,
+                         self.profile.event_costs if self.profile != None else None)
+
+    def on_telemetry(self, data: ChData):
+        with self.changed:
+            self.on_data(data, ch_index_keys(data), str(data.get_display_text()), self.telemetry_windows, self.telemetry_verdicts, ch_data_to_str,
+                         self.profile.telemetry_costs if self.profile != None else None)
+
+    def on_data(self, data, keys: list[str], value: str, windows: WindowIndex, verdicts: list[Verdict], to_str: Callable,
+                costs: list[ExpectationCost] | None = None):
+        if not self.running:
+            return
+        validation_start = time.perf_counter() if costs != None else 0.0
+        time_ms = 1000 * (data.get_time().get_float() - self.starting_time)
+        closed_any = False
+        for key in keys:
+            # Only the expectations on key whose window contains the reception time
+            for idx in windows.at(key, time_ms):
+                verdict = verdicts[idx]
+                if verdict.closed:
+                    continue
+                matched = verdict.instr.matches_value(value) if costs == None else costs[idx].check(value)
+                if verdict.observe(data, matched):
+                    self.close(verdict, to_str)
+                    closed_any = True
+        if costs != None:
+            self.profile.items += 1
+            self.profile.validation_seconds += time.perf_counter() - validation_start
+        if closed_any:
+            self.clock.notify(self.changed)
+
+    def close(self, verdict: Verdict, to_str: Callable, report: bool = True):
+        verdict.closed = True
+        if not verdict.success():
+            self.failed = True
+            if report:
+                match_ = to_str(verdict.evidence(), self.starting_time) if verdict.evidence() is not None else "None"
+                print(f"{verdict.instr}: {make_red('[FAIL]')} ~> {match_}", file=self.out)
+
+    def close_windows(self, force: bool = False) -> float | None:
+        """Close expired windows and return the end time (in s) of the next window to expire."""
+        now_ms = 1000 * (self.clock.time() - self.starting_time)
+        while self.next_closing < len(self.closing_order):
+            verdict, to_str = self.closing_order[self.next_closing]
+            if not verdict.closed:
+                if not force and verdict.instr.end_time_ms >= now_ms:
+                    return self.starting_time + 0.001 * verdict.instr.end_time_ms
+                self.close(verdict, to_str, report=not force)
+            self.next_closing += 1
+        return None
+
+    def aborted(self, fail_fast: bool) -> bool:
+        return fail_fast and self.failed
+
+    def wait(self, timeout: float, fail_fast: bool) -> None:
+        """Sleep for timeout seconds, returning early if fail_fast and an expectation failed."""
+        deadline = self.clock.monotonic() + timeout
+        with self.changed:
+            while not self.aborted(fail_fast) and (remaining := deadline - self.clock.monotonic()) > 0:
+                self.clock.wait(self.changed, remaining)
+
+    def wait_until_settled(self, deadline: float, fail_fast: bool) -> None:
+        """Wait until all expectations are settled or until deadline, whichever comes first."""
+        with self.changed:
+            while not self.aborted(fail_fast):
+                next_end = self.close_windows()
+                if next_end == None or self.clock.time() >= deadline:
+                    break
+                self.clock.wait(self.changed, max(0, min(next_end, deadline) - self.clock.time()) + 0.001)